@@ -0,0 +1,79 @@
+"""This module defines a Bloom filter used by the crawler to remember
+the URLs already added to its queue with a small, fixed memory footprint."""
+
+import hashlib
+import math
+
+
+class BloomFilter:
+    """
+    A probabilistic set of strings. Membership tests never give false negatives,
+    and give false positives with a probability close to `error_rate` as long as
+    no more than `capacity` items have been added.
+
+    The k bit positions of an item are derived from two 64-bit hashes with the
+    Kirsch-Mitzenmacher double hashing scheme, so only one hash is computed per item.
+
+    Attributes:
+        capacity (int): The number of items the filter is sized for.
+        error_rate (float): The target false positive probability.
+        size (int): The number of bits of the filter.
+        nb_hashes (int): The number of bit positions set per item.
+        bits (bytearray): The bit array of the filter.
+        count (int): The number of items added to the filter.
+
+    Methods:
+        add(item): Adds an item to the filter.
+        get_positions(item): Computes the bit positions of an item.
+    """
+
+    def __init__(self, capacity, error_rate=1e-7):
+        if not isinstance(capacity, int) or capacity <= 0:
+            raise ValueError("capacity must be a positive integer")
+
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate must be between 0 and 1")
+
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.nb_hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def get_positions(self, item):
+        """
+        Computes the bit positions of an item.
+
+        Args:
+            item (str): The item to hash.
+
+        Returns:
+            list: The nb_hashes bit positions of the item.
+        """
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little")
+        return [(h1 + i * h2) % self.size for i in range(self.nb_hashes)]
+
+    def add(self, item):
+        """
+        Adds an item to the filter.
+
+        Args:
+            item (str): The item to add.
+
+        Returns:
+            None
+        """
+        for pos in self.get_positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(
+            self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self.get_positions(item)
+        )
+
+    def __len__(self):
+        return self.count
@@ -2,13 +2,35 @@
 extracts content from pages, and stores results for further analysis."""
 
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import logging
+import threading
 import time
-import json
 import os
+import pickle
 from urllib import robotparser, parse
+import orjson
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from selectolax.lexbor import LexborHTMLParser
+from crawler.bloom_filter import BloomFilter
+
+
+@lru_cache(maxsize=100_000)
+def get_netloc(url):
+    """
+    Returns the network location of a URL, caching the result as the same links
+    appear on most pages of a site.
+
+    Args:
+        url (str): The URL to parse.
+
+    Returns:
+        str: The network location of the URL.
+    """
+    return parse.urlparse(url).netloc
 
 
 class Crawler:
@@ -21,24 +43,56 @@ class Crawler:
         url (str): The base URL to start crawling from.
         max_pages (int): The maximum number of pages to crawl. Default is 50.
         pages_visited (int): Counter for the number of pages that have been crawled.
-        visited_urls (set): A set of URLs that have been crawled to avoid revisiting.
+        seen_urls (BloomFilter): A Bloom filter of the URLs that have already been added
+            to the queue, to avoid crawling a page twice.
         priority_word (str): A keyword to prioritize certain links for crawling.
         queue (deque): A queue of URLs to crawl next.
         user_agent (str): The user-agent string to identify the crawler to the server.
-        parser (RobotFileParser): A robot file parser for checking crawl permissions.
-        politeness (int): Delay in seconds between requests to avoid overloading the server.
+        parser (RobotFileParser): The robot file parser of the base URL.
+        ROBOTS_TTL (int): The number of seconds a robots.txt file is cached for.
+        EXPECTED_LINKS_PER_PAGE (int): The number of distinct links expected per crawled
+            page, used to size the Bloom filter of the seen URLs.
+        ROBOTS_CACHE_FILE (str): The file the robots.txt cache is saved to between crawls.
+        MAX_PAGE_SIZE (int): The maximum size in bytes of a fetched page.
+        robots_cache (dict): Robot file parsers shared between crawlers, keyed by host,
+            along with the time they were fetched.
+        politeness (int): Delay in seconds between requests to the same host,
+            used when its robots.txt file does not define a crawl delay.
+        max_workers (int): The maximum number of pages fetched concurrently.
+        host_locks (dict): A lock per host, guarding the politeness delay of that host.
+        last_access (dict): The time of the last request sent to each host.
+        session (Session): A persistent HTTP session reusing connections between requests.
 
     Methods:
         crawl(): Starts the crawling process, visiting pages, extracting content,
                  and adding links to the crawl queue.
+        get_crawl_delay(url): Returns the delay between two requests to the host of the URL.
+        wait_politeness(url): Waits until the host of the URL can be requested again.
+        fetch_page(url): Waits for the politeness delay and extracts the page content.
+        get_robots(url): Returns the robot file parser of the host of the URL.
+        load_robots_cache(): Loads the robot file parsers saved by a previous crawl.
+        save_robots_cache(): Saves the robot file parsers for the next crawls.
         is_allowed_to_crawl(robots_url): Checks if the URL is allowed to be crawled.
-        parse_html(url): Parses the HTML content of a URL and returns a BeautifulSoup object.
+        fetch_html(url): Fetches the HTML content of a URL.
+        parse_html(url): Parses the HTML content of a URL with selectolax.
         extract_page_content(url): Extracts the title, first paragraph, and internal links.
         save_results(results): Saves the crawled data to a JSON file.
     """
 
+    ROBOTS_TTL = 24 * 60 * 60
+    EXPECTED_LINKS_PER_PAGE = 100
+    MAX_PAGE_SIZE = 5 * 1024 * 1024
+    ROBOTS_CACHE_FILE = "output/robots_cache.pkl"
+    robots_cache = {}
+
     def __init__(
-        self, url, max_pages=50, politeness=1, priority_word="product", user_agent="*"
+        self,
+        url,
+        max_pages=50,
+        politeness=1,
+        priority_word="product",
+        user_agent="*",
+        max_workers=10,
     ):
         if not url.startswith("http"):
             raise ValueError("URL must start with 'http' or 'https'")
@@ -55,27 +109,45 @@ class Crawler:
         if not isinstance(user_agent, str):
             raise ValueError("user_agent must be a string")
 
+        if not isinstance(max_workers, int):
+            raise ValueError("max_workers must be an integer")
+
         if max_pages <= 0:
             raise ValueError("max_pages must be a positive integer")
 
         if politeness <= 0:
             raise ValueError("politeness must be a positive integer or float")
 
+        if max_workers <= 0:
+            raise ValueError("max_workers must be a positive integer")
+
         self.url = url
         self.max_pages = max_pages
         self.pages_visited = 0
-        self.visited_urls = set()
+        self.seen_urls = BloomFilter(capacity=max_pages * self.EXPECTED_LINKS_PER_PAGE)
+        self.seen_urls.add(url)
         self.priority_word = priority_word
         self.queue = deque([url])
+        self.max_workers = max_workers
+        self.host_locks = {}
+        self.last_access = {}
+
+        self.session = requests.Session()
+        if user_agent != "*":
+            self.session.headers["User-Agent"] = user_agent
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=max_workers,
+            max_retries=Retry(total=2, backoff_factor=0.3),
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
 
         self.base_url = parse.urlparse(url).scheme + "://" + parse.urlparse(url).netloc
         self.user_agent = user_agent
-        self.parser = robotparser.RobotFileParser()
-        self.parser.set_url(self.base_url + "/robots.txt")
-        self.parser.read()
-        self.politeness = (
-            self.parser.crawl_delay("*") if self.parser.crawl_delay("*") else politeness
-        )
+        self.load_robots_cache()
+        self.parser = self.get_robots(url)
+        self.politeness = politeness
 
     def crawl(self):
         """
@@ -85,9 +157,10 @@ class Crawler:
 
         The method performs the following:
             - Checks if the URL is allowed to crawl according to robots.txt.
+            - Fetches up to max_workers pages concurrently.
             - Extracts content from each page (title, first paragraph, and links).
             - Prioritizes URLs containing the priority_word for crawling.
-            - Sleeps for the defined politeness delay between requests.
+            - Waits for the defined politeness delay between requests to the same host.
             - Saves the results to a JSON file after crawling.
 
         Returns:
@@ -95,49 +168,156 @@ class Crawler:
         """
 
         results = []
+        base_netloc = get_netloc(self.base_url)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while self.queue and self.pages_visited < self.max_pages:
+                batch_size = min(self.max_workers, self.max_pages - self.pages_visited)
+                batch = []
+                while self.queue and len(batch) < batch_size:
+                    url = self.queue.popleft()
+
+                    if not self.is_allowed_to_crawl(url):
+                        logging.error("Not allowed to crawl %s", url)
+                        continue
+
+                    logging.info(
+                        f"Crawling page {self.pages_visited + len(batch) + 1}/{self.max_pages}: {url}"
+                    )
+                    batch.append(url)
+
+                for url, content in zip(batch, executor.map(self.fetch_page, batch)):
+                    if not content:
+                        continue
+
+                    results.append(content)
+                    self.pages_visited += 1
+
+                    priority_links = []
+                    other_links = []
+                    for link in content["links"]:
+                        if link in self.seen_urls:
+                            continue
+                        if get_netloc(link) != base_netloc:
+                            continue
+                        self.seen_urls.add(link)
+                        if self.priority_word in link:
+                            priority_links.append(link)
+                        else:
+                            other_links.append(link)
+
+                    self.queue.extendleft(reversed(priority_links))
+                    self.queue.extend(other_links)
+
+        self.session.close()
+        self.save_robots_cache()
+        self.save_results(results)
+        logging.info("Crawling complete")
+
+    def get_crawl_delay(self, url):
+        """
+        Returns the delay between two requests to the host of the given URL: the
+        crawl delay of its robots.txt file if defined, the politeness otherwise.
+
+        Args:
+            url (str): A URL of the host.
+
+        Returns:
+            float: The delay in seconds.
+        """
+        crawl_delay = self.get_robots(url).crawl_delay(self.user_agent)
+        return crawl_delay if crawl_delay else self.politeness
+
+    def wait_politeness(self, url):
+        """
+        Waits until the crawl delay since the last request to the host of the URL
+        has elapsed. Requests to different hosts do not wait for each other.
+
+        Args:
+            url (str): The URL about to be requested.
+
+        Returns:
+            None
+        """
+        host = get_netloc(url)
+        lock = self.host_locks.setdefault(host, threading.Lock())
+        with lock:
+            wait = self.last_access.get(host, 0) + self.get_crawl_delay(url) - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            self.last_access[host] = time.time()
+
+    def fetch_page(self, url):
+        """
+        Fetches a page once the politeness delay of its host has elapsed,
+        and extracts its content.
+
+        Args:
+            url (str): The URL of the page to fetch.
 
-        while self.queue and self.pages_visited < self.max_pages:
-            url = self.queue.popleft()
+        Returns:
+            dict or None: The page content, or None if the page could not be parsed.
+        """
+        self.wait_politeness(url)
+        return self.extract_page_content(url)
 
-            if not self.is_allowed_to_crawl(url):
-                logging.error("Not allowed to crawl")
+    def get_robots(self, url):
+        """
+        Returns the robot file parser of the host of the given URL. The robots.txt
+        file of a host is fetched at most once every ROBOTS_TTL seconds.
 
-            if url in self.visited_urls:
-                continue
+        Args:
+            url (str): A URL of the host.
 
-            logging.info(
-                f"Crawling page {self.pages_visited + 1}/{self.max_pages}: {url}"
-            )
+        Returns:
+            RobotFileParser: The robot file parser of the host.
+        """
+        parsed_url = parse.urlparse(url)
+        host = parsed_url.netloc
+        now = time.time()
 
-            content = self.extract_page_content(url)
+        cached = Crawler.robots_cache.get(host)
+        if cached and now - cached[1] < self.ROBOTS_TTL:
+            return cached[0]
 
-            if content:
-                results.append(content)
-                self.pages_visited += 1
-                self.visited_urls.add(url)
+        parser = robotparser.RobotFileParser()
+        parser.set_url(f"{parsed_url.scheme}://{host}/robots.txt")
+        parser.read()
+        Crawler.robots_cache[host] = (parser, now)
+        return parser
 
-                internal_links = [
-                    link
-                    for link in content["links"]
-                    if parse.urlparse(link).netloc == parse.urlparse(self.base_url).netloc
-                ]
+    def load_robots_cache(self):
+        """
+        Loads the robot file parsers saved by a previous crawl, if any.
 
-                priority_links = [
-                    link for link in internal_links if self.priority_word in link
-                ]
+        Returns:
+            None
+        """
+        if not os.path.exists(self.ROBOTS_CACHE_FILE):
+            return
 
-                other_links = [
-                    link for link in internal_links if self.priority_word not in link
-                ]
+        try:
+            with open(self.ROBOTS_CACHE_FILE, "rb") as f:
+                saved_cache = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            logging.error("Failed to load the robots.txt cache")
+            return
 
-                for link in reversed(priority_links):
-                    self.queue.appendleft(link)
-                self.queue.extend(other_links)
+        for host, (parser, fetched_at) in saved_cache.items():
+            if host not in Crawler.robots_cache:
+                Crawler.robots_cache[host] = (parser, fetched_at)
 
-            time.sleep(self.politeness)
+    def save_robots_cache(self):
+        """
+        Saves the robot file parsers so that the next crawls can reuse them.
 
-        self.save_results(results)
-        logging.info("Crawling complete")
+        Returns:
+            None
+        """
+        if not os.path.exists("output"):
+            os.makedirs("output")
+        with open(self.ROBOTS_CACHE_FILE, "wb") as f:
+            pickle.dump(Crawler.robots_cache, f)
 
     def is_allowed_to_crawl(self, url):
         """
@@ -149,24 +329,54 @@ class Crawler:
         Returns:
             bool: True if the URL can be crawled, False otherwise.
         """
-        return self.parser.can_fetch(self.user_agent, url)
+        return self.get_robots(url).can_fetch(self.user_agent, url)
+
+    def fetch_html(self, url):
+        """
+        Fetches the HTML content of a given URL. Responses which are not HTML,
+        or larger than MAX_PAGE_SIZE bytes, are skipped before reading their body.
+
+        Args:
+            url (str): The URL to fetch.
+
+        Returns:
+            bytes or None: The HTML content, or None if the request failed
+                or the response is not an HTML page.
+        """
+        with self.session.get(url, timeout=5, stream=True) as response:
+            if response.status_code != 200:
+                logging.error("Failed to parse HTML")
+                return None
+
+            content_type = response.headers.get("Content-Type", "text/html")
+            if "html" not in content_type:
+                logging.info("Skipping %s: content type is %s", url, content_type)
+                return None
+
+            content_length = response.headers.get("Content-Length", "0")
+            if content_length.isdigit() and int(content_length) > self.MAX_PAGE_SIZE:
+                logging.info("Skipping %s: page too large", url)
+                return None
+
+            return response.content
 
     def parse_html(self, url):
         """
-        Parses the HTML content of a given URL and returns a BeautifulSoup object.
+        Parses the HTML content of a given URL with selectolax, which only builds the
+        lightweight tree needed to read a few elements.
 
         Args:
             url (str): The URL to fetch and parse HTML content from.
 
         Returns:
-            BeautifulSoup: A BeautifulSoup object containing the parsed HTML content.
+            LexborHTMLParser or None: The parsed HTML content, or None if the page
+                could not be fetched.
         """
-        response = requests.get(url, timeout=5)
-        if response.status_code != 200:
-            logging.error("Failed to parse HTML")
+        html = self.fetch_html(url)
+        if html is None:
             return None
 
-        return BeautifulSoup(response.text, "html.parser")
+        return LexborHTMLParser(html)
 
     def extract_page_content(self, url):
         """
@@ -176,30 +386,36 @@ class Crawler:
             url (str): The URL of the page to extract content from.
 
         Returns:
-            dict: A dictionary containing the page's title, URL, first paragraph,
-                  and a list of internal links.
+            dict or None: A dictionary containing the page's title, URL, first paragraph,
+                  and a list of internal links, or None if the page could not be parsed.
         """
 
-        soup = self.parse_html(url)
+        tree = self.parse_html(url)
+        if tree is None:
+            return None
+
+        title_node = tree.css_first("title")
+        paragraph_node = tree.css_first("p")
 
-        title = soup.title.string if soup.title else ""
-        first_paragraph = soup.p.text if soup.p else ""
-        links = [
-            parse.urljoin(url, link["href"]) for link in soup.find_all("a", href=True)
-        ]
-        links = list(set(links))
+        title = title_node.text() if title_node else ""
+        first_paragraph = paragraph_node.text() if paragraph_node else ""
+        links = {
+            parse.urljoin(url, link.attributes.get("href") or "")
+            for link in tree.css("a[href]")
+        }
 
         content = {
             "title": title,
             "url": url,
             "first_paragraph": first_paragraph,
-            "links": links,
+            "links": list(links),
         }
         return content
 
     def save_results(self, results):
         """
-        Saves the crawled data to a JSON file.
+        Saves the crawled data to a JSON file. The data is written to a temporary
+        file first, then renamed, so an interrupted crawl never leaves a truncated file.
 
         Args:
             results (list): A list of dictionaries containing the crawled data.
@@ -209,6 +425,8 @@ class Crawler:
         """
         if not os.path.exists("output/crawler"):
             os.makedirs("output/crawler")
-        with open("output/crawler/results.json", "w", encoding="utf-8") as f:
-            json.dump(results, f, indent=4)
+        data = orjson.dumps(results, option=orjson.OPT_INDENT_2)
+        with open("output/crawler/results.json.tmp", "wb") as f:
+            f.write(data)
+        os.replace("output/crawler/results.json.tmp", "output/crawler/results.json")
         logging.info("Results saved to output/crawler/results.json")
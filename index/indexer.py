@@ -1,13 +1,16 @@
 """This module provides an Indexer class for indexing product data from a JSONL file."""
 
-import json
 import logging
 import string
 import re
 import os
+import pickle
 import nltk
+import orjson
 from collections import defaultdict
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+from operator import itemgetter
 from nltk.corpus import stopwords
 from index.product import Product
 
@@ -21,18 +24,39 @@ class Indexer:
     reviews, features, titles, and descriptions.
 
     Attributes:
-        STOPWORDS (set): A set of common words to ignore during tokenization.
+        STOPWORDS (frozenset): A set of common words to ignore during tokenization.
+        PARALLEL_PARSE_MIN_LINES (int): The number of lines from which the JSONL file
+            is parsed by a pool of processes.
+        PARALLEL_PARSE_CHUNK_SIZE (int): The number of lines parsed by each process task.
+        PUNCTUATION_TABLE (dict): A translation table removing punctuation characters.
+        VARIANT_RE (Pattern): A compiled pattern extracting the variant from a URL.
+        PRODUCT_ID_RE (Pattern): A compiled pattern extracting the id number from a URL.
         jsonl_file (str): The path to the JSONL file containing product data.
         products_list (list): A list of `Product` objects parsed from the JSONL file.
+        doc_numbers (dict): The position of each product ID in `products_list`, used as
+            a dense document number.
 
     Methods:
         build_index():
             Builds and saves various indices, including reviews, features,
             title, and description indices.
 
+        build_all_indexes(features_list: list) -> dict:
+            Builds the reviews, features, title and description indices
+            in a single pass over the products.
+
         parse_jsonl():
             Parses the JSONL file and initializes `Product` objects.
 
+        add_products(products: list):
+            Adds products to `products_list` and numbers them.
+
+        load_products():
+            Loads the products from a pickle cache of the JSONL file, or parses it.
+
+        parse_lines(lines: list) -> list:
+            Parses JSONL lines into `Product` objects.
+
         extract_variant(url: str) -> str | None:
             Extracts the variant identifier from a product URL.
 
@@ -42,6 +66,21 @@ class Indexer:
         tokenize_with_positions(text: str) -> list:
             Tokenizes text while keeping track of token positions.
 
+        get_reviews_stats(reviews: list) -> dict:
+            Computes the total reviews, average rating and last rating of a product.
+
+        add_product_features(features_indexes: dict, product: Product):
+            Adds the features of a product to the features indexes.
+
+        add_token_positions(postings: list, product_id: str, text: str):
+            Adds the positions of the tokens of a text to a flat list of postings.
+
+        to_features_dict(features_index: defaultdict) -> dict:
+            Converts a features index being built into a JSON serializable dictionary.
+
+        to_positional_dict(postings: list) -> dict:
+            Groups a flat list of postings into a positional index.
+
         build_reviews_index() -> dict:
             Builds an index for product reviews, including total reviews,
             average rating, and last rating.
@@ -49,6 +88,9 @@ class Indexer:
         build_features_index(feature: str) -> dict:
             Builds an index for specific product features.
 
+        build_features_indexes(features_list: list) -> dict:
+            Builds the indexes of several product features in a single pass.
+
         build_title_positional_index() -> dict:
             Constructs a positional index for product titles.
 
@@ -64,13 +106,22 @@ class Indexer:
     #     for line in file:
     #         STOPWORDS.add(line.strip())
 
-    nltk.download("stopwords")
-    STOPWORDS = stopwords.words("english")
+    try:
+        STOPWORDS = frozenset(stopwords.words("english"))
+    except LookupError:
+        nltk.download("stopwords", quiet=True)
+        STOPWORDS = frozenset(stopwords.words("english"))
     DATA_PATH = "data/TP3"
+    PARALLEL_PARSE_MIN_LINES = 50_000
+    PARALLEL_PARSE_CHUNK_SIZE = 10_000
+    PUNCTUATION_TABLE = str.maketrans("", "", string.punctuation)
+    VARIANT_RE = re.compile(r"variant=([^&]+)")
+    PRODUCT_ID_RE = re.compile(r"/product/(\d+)")
 
     def __init__(self, jsonl_file):
         self.jsonl_file = jsonl_file
         self.products_list = []
+        self.doc_numbers = {}
 
     def build_index(self):
         """
@@ -95,21 +146,23 @@ class Indexer:
         if not os.path.exists("output/indexes/feature"):
             os.makedirs("output/indexes/feature")
 
-        index = self.build_reviews_index()
-        self.save_index_to_json(index, "review/reviews_index.json")
+        indexes = self.build_all_indexes(features_list)
+
+        self.save_index_to_json(indexes["reviews"], "review/reviews_index.json")
         logging.info("Index saved to output/indexes/review/reviews_index.json")
 
         for feature in features_list:
-            index = self.build_features_index(feature)
-            self.save_index_to_json(index, f"feature/{feature}_index.json")
+            self.save_index_to_json(
+                indexes["features"][feature], f"feature/{feature}_index.json"
+            )
             logging.info("Index saved to output/indexes/feature/%s_index.json", feature)
 
-        index = self.build_title_positional_index()
-        self.save_index_to_json(index, "title/title_positional_index.json")
+        self.save_index_to_json(indexes["title"], "title/title_positional_index.json")
         logging.info("Index saved to output/indexes/title/title_positional_index.json")
 
-        index = self.build_desc_positional_index()
-        self.save_index_to_json(index, "description/description_positional_index.json")
+        self.save_index_to_json(
+            indexes["description"], "description/description_positional_index.json"
+        )
         logging.info(
             "Index saved to output/indexes/description/description_positional_index.json"
         )
@@ -117,14 +170,85 @@ class Indexer:
     def parse_jsonl(self):
         """
         Parses the JSONL file and stores product data in the products_list.
+        Large files are parsed in chunks by a pool of processes.
+        """
+        with open(self.jsonl_file, "rb") as file:
+            lines = [line for line in file.read().split(b"\n") if line.strip()]
+
+        if len(lines) < Indexer.PARALLEL_PARSE_MIN_LINES:
+            products = Indexer.parse_lines(lines)
+        else:
+            chunk_size = Indexer.PARALLEL_PARSE_CHUNK_SIZE
+            chunks = [
+                lines[i : i + chunk_size] for i in range(0, len(lines), chunk_size)
+            ]
+            with ProcessPoolExecutor() as executor:
+                products = [
+                    product
+                    for chunk_products in executor.map(Indexer.parse_lines, chunks)
+                    for product in chunk_products
+                ]
+
+        for product in products:
+            product.set_variant(self.extract_variant(product.id))
+        self.add_products(products)
+        logging.info("%d products added to the index.", len(products))
+
+    def add_products(self, products):
+        """
+        Adds products to the products_list and numbers them.
+
+        Args:
+            products (list): The `Product` objects to add.
+        """
+        self.products_list.extend(products)
+        self.doc_numbers = {
+            product.id: number for number, product in enumerate(self.products_list)
+        }
+
+    def load_products(self):
+        """
+        Loads the products of the JSONL file. The parsed products are cached in a
+        pickle file next to the JSONL file, and reused as long as the JSONL file
+        has not been modified since.
+        """
+        cache_file = f"{os.path.splitext(self.jsonl_file)[0]}.pkl"
+        mtime = os.path.getmtime(self.jsonl_file)
+
+        if os.path.exists(cache_file):
+            try:
+                with open(cache_file, "rb") as file:
+                    cache = pickle.load(file)
+                if cache["mtime"] == mtime:
+                    self.add_products(cache["products"])
+                    logging.info(
+                        "%d products loaded from %s.", len(cache["products"]), cache_file
+                    )
+                    return
+            except Exception:
+                # A stale cache may fail to unpickle in many ways, e.g. after the
+                # Product class changed, so the file is parsed again in any case.
+                logging.error("Failed to load the products cache %s", cache_file)
+
+        self.parse_jsonl()
+        try:
+            with open(cache_file, "wb") as file:
+                pickle.dump({"mtime": mtime, "products": self.products_list}, file)
+        except OSError:
+            logging.error("Failed to save the products cache %s", cache_file)
+
+    @staticmethod
+    def parse_lines(lines):
+        """
+        Parses JSONL lines into products.
+
+        Args:
+            lines (list): The JSONL lines, as bytes.
+
+        Returns:
+            list: The `Product` objects parsed from the lines.
         """
-        with open(self.jsonl_file, "r", encoding="utf-8") as file:
-            for line in file:
-                json_line = json.loads(line)
-                product = Product(json_line)
-                product.set_variant(self.extract_variant(product.id))
-                self.products_list.append(product)
-                logging.info("Product %s added to the index.", product.title)
+        return [Product.from_json(orjson.loads(line)) for line in lines]
 
     def extract_variant(self, url):
         """
@@ -136,12 +260,12 @@ class Indexer:
         Returns:
             str or None: The extracted variant if present, otherwise None.
         """
-        match = re.search(r"variant=([^&]+)", url)
+        match = Indexer.VARIANT_RE.search(url)
         if match:
             return match.group(1)
         return None
 
-    def extract_product_id(url):
+    def extract_product_id(self, url):
         """
         Extracts the id number from a URL.
 
@@ -151,7 +275,7 @@ class Indexer:
         Returns:
             int or None: The id number if present, otherwise None.
         """
-        match = re.search(r'/product/(\d+)', url)
+        match = Indexer.PRODUCT_ID_RE.search(url)
         if match:
             return match.group(1)
         return None
@@ -164,12 +288,12 @@ class Indexer:
             product_id (str): The ID of the product to retrieve.
 
         Returns:
-            Product: The product object with the specified ID.
+            Product: The product object with the specified ID, or None if it is unknown.
         """
-        for product in self.products_list:
-            if product.id == product_id:
-                return product
-        return None
+        number = self.doc_numbers.get(product_id)
+        if number is None:
+            return None
+        return self.products_list[number]
 
     def tokenize(self, text):
         """
@@ -181,12 +305,8 @@ class Indexer:
         Returns:
             list: A list of filtered tokens.
         """
-        text = text.lower()
-        text = re.sub(r"[" + re.escape(string.punctuation) + "]", "", text)
-
-        tokens = text.split()
-        tokens = [token for token in tokens if token not in Indexer.STOPWORDS]
-        return tokens
+        text = text.lower().translate(Indexer.PUNCTUATION_TABLE)
+        return [token for token in text.split() if token not in Indexer.STOPWORDS]
 
     def tokenize_with_positions(self, text):
         """
@@ -198,8 +318,7 @@ class Indexer:
         Returns:
             list: A list of tuples where each tuple contains the token index and the token itself.
         """
-        text = text.lower()
-        text = re.sub(r"[" + re.escape(string.punctuation) + "]", "", text)
+        text = text.lower().translate(Indexer.PUNCTUATION_TABLE)
 
         tokens = text.split()
         indexed_tokens = list(enumerate(tokens))
@@ -212,6 +331,130 @@ class Indexer:
 
         return filtered_tokens
 
+    def build_all_indexes(self, features_list):
+        """
+        Builds the reviews, features, title and description indexes
+        in a single pass over the products.
+
+        Args:
+            features_list (list): The feature names to index.
+
+        Returns:
+            dict: A dictionary with the reviews index under "reviews", the features
+                indexes by feature name under "features", and the title and description
+                positional indexes under "title" and "description".
+        """
+        reviews_index = {}
+        features_indexes = {feature: defaultdict(set) for feature in features_list}
+        title_postings = []
+        desc_postings = []
+        for product in self.products_list:
+            reviews_index[product.id] = self.get_reviews_stats(product.product_rewiews)
+            self.add_product_features(features_indexes, product)
+            self.add_token_positions(title_postings, product.id, product.title)
+            self.add_token_positions(desc_postings, product.id, product.description)
+
+        return {
+            "reviews": reviews_index,
+            "features": {
+                feature: self.to_features_dict(index)
+                for feature, index in features_indexes.items()
+            },
+            "title": self.to_positional_dict(title_postings),
+            "description": self.to_positional_dict(desc_postings),
+        }
+
+    def get_reviews_stats(self, reviews):
+        """
+        Computes the review statistics of a product.
+
+        Args:
+            reviews (list): The reviews of the product.
+
+        Returns:
+            dict: The total reviews, average rating and last rating of the product.
+        """
+        if not reviews:
+            return {
+                "total_reviews": 0,
+                "average_rating": None,
+                "last_rating": None,
+            }
+
+        total = len(reviews)
+        avg = sum(review.get("rating", 0) for review in reviews) / total
+
+        # ISO dates (YYYY-MM-DD) compare as strings; reversed() keeps the last
+        # review among those sharing the latest date, as a stable sort would.
+        last_review = max(reversed(reviews), key=itemgetter("date"))
+        last_rating = last_review.get("rating", None)
+        return {
+            "total_reviews": total,
+            "average_rating": avg,
+            "last_rating": last_rating,
+        }
+
+    def add_product_features(self, features_indexes, product):
+        """
+        Adds the features of a product to the features indexes.
+
+        Args:
+            features_indexes (dict): The features indexes, mapping each feature name
+                to a dictionary of feature tokens to sets of product IDs.
+            product (Product): The product to add.
+        """
+        for feature, features_index in features_indexes.items():
+            value = product.product_features.get(feature)
+            if isinstance(value, str):
+                features_index[value.lower()].add(product.id)
+
+    def add_token_positions(self, postings, product_id, text):
+        """
+        Adds the positions of the tokens of a text to a flat list of postings.
+
+        Args:
+            postings (list): The postings, as (token, product ID, position) tuples.
+            product_id (str): The ID of the product the text belongs to.
+            text (str): The text to tokenize.
+        """
+        postings.extend(
+            (token, product_id, pos) for pos, token in self.tokenize_with_positions(text)
+        )
+
+    def to_features_dict(self, features_index):
+        """
+        Converts a features index being built into a JSON serializable dictionary.
+
+        Args:
+            features_index (defaultdict): A dictionary mapping feature tokens to sets of product IDs.
+
+        Returns:
+            dict: A dictionary mapping feature tokens to lists of product IDs.
+        """
+        return {token: list(ids) for token, ids in features_index.items()}
+
+    def to_positional_dict(self, postings):
+        """
+        Groups a flat list of postings into a positional index. The postings are sorted
+        by token and product ID once; the positions of a product stay in text order.
+
+        Args:
+            postings (list): The postings, as (token, product ID, position) tuples.
+
+        Returns:
+            dict: A dictionary mapping tokens to product IDs and their positions.
+        """
+        postings.sort(key=itemgetter(0, 1))
+        return {
+            token: {
+                product_id: [pos for _, _, pos in product_postings]
+                for product_id, product_postings in groupby(
+                    token_postings, key=itemgetter(1)
+                )
+            }
+            for token, token_postings in groupby(postings, key=itemgetter(0))
+        }
+
     def build_reviews_index(self):
         """
         Builds an index for product reviews, including total reviews,
@@ -220,31 +463,28 @@ class Indexer:
         Returns:
             dict: A dictionary mapping product IDs to review statistics.
         """
-        products_list = self.products_list
-        reviews_index = {}
-        for product in products_list:
-            product_id = product.id
-            reviews = product.product_rewiews
-            if not reviews:
-                reviews_index[product_id] = {
-                    "total_reviews": 0,
-                    "average_rating": None,
-                    "last_rating": None,
-                }
-            else:
-                total = len(reviews)
-                avg = sum(review.get("rating", 0) for review in reviews) / total
-
-                reviews_sorted = sorted(
-                    reviews, key=lambda x: datetime.strptime(x["date"], "%Y-%m-%d")
-                )
-                last_rating = reviews_sorted[-1].get("rating", None)
-                reviews_index[product_id] = {
-                    "total_reviews": total,
-                    "average_rating": avg,
-                    "last_rating": last_rating,
-                }
-        return reviews_index
+        return {
+            product.id: self.get_reviews_stats(product.product_rewiews)
+            for product in self.products_list
+        }
+
+    def build_features_indexes(self, features_list):
+        """
+        Builds the indexes of several product features in a single pass over the products.
+
+        Args:
+            features_list (list): The feature names to index.
+
+        Returns:
+            dict: A dictionary mapping each feature name to its index.
+        """
+        features_indexes = {feature: defaultdict(set) for feature in features_list}
+        for product in self.products_list:
+            self.add_product_features(features_indexes, product)
+        return {
+            feature: self.to_features_dict(index)
+            for feature, index in features_indexes.items()
+        }
 
     def build_features_index(self, feature):
         """
@@ -256,20 +496,7 @@ class Indexer:
         Returns:
             dict: A dictionary mapping feature tokens to product IDs.
         """
-        products_list = self.products_list
-        features_index = defaultdict(set)
-        for product in products_list:
-            product_id = product.id
-            features = product.product_features
-            for feature_name, value in features.items():
-                if not isinstance(value, str):
-                    continue
-                if feature_name == feature:
-                    token = value.lower()
-                    features_index[token].add(product_id)
-
-        features_index = {token: list(ids) for token, ids in features_index.items()}
-        return features_index
+        return self.build_features_indexes([feature])[feature]
 
     def build_title_positional_index(self):
         """
@@ -278,19 +505,10 @@ class Indexer:
         Returns:
             dict: A dictionary mapping tokens to product IDs and their positions.
         """
-        products_list = self.products_list
-        index = defaultdict(lambda: defaultdict(list))
-        for product in products_list:
-            product_id = product.id
-            title = product.title
-            positions_tokens = self.tokenize_with_positions(title)
-            for pos, token in positions_tokens:
-                if pos not in index[token][product_id]:
-                    index[token][product_id].append(pos)
-        positional_index = {}
-        for token, doc_positions in index.items():
-            positional_index[token] = dict(doc_positions.items())
-        return positional_index
+        postings = []
+        for product in self.products_list:
+            self.add_token_positions(postings, product.id, product.title)
+        return self.to_positional_dict(postings)
 
     def build_desc_positional_index(self):
         """
@@ -299,19 +517,10 @@ class Indexer:
         Returns:
             dict: A dictionary mapping tokens to product IDs and their positions.
         """
-        products_list = self.products_list
-        index = defaultdict(lambda: defaultdict(list))
-        for product in products_list:
-            product_id = product.id
-            desc = product.description
-            positions_tokens = self.tokenize_with_positions(desc)
-            for pos, token in positions_tokens:
-                if pos not in index[token][product_id]:
-                    index[token][product_id].append(pos)
-        positional_index = {}
-        for token, doc_positions in index.items():
-            positional_index[token] = dict(doc_positions.items())
-        return positional_index
+        postings = []
+        for product in self.products_list:
+            self.add_token_positions(postings, product.id, product.description)
+        return self.to_positional_dict(postings)
 
     def save_index_to_json(self, index, filename="index.json"):
         """
@@ -321,8 +530,8 @@ class Indexer:
             index (dict): The index data to save.
             filename (str): The output filename.
         """
-        with open(f"output/indexes/{filename}", "w", encoding="utf-8") as file:
-            json.dump(index, file, indent=4)
+        with open(f"output/indexes/{filename}", "wb") as file:
+            file.write(orjson.dumps(index, option=orjson.OPT_INDENT_2))
 
     def load_index_from_json(self, filename="index.json"):
         """
@@ -334,6 +543,6 @@ class Indexer:
         Returns:
             dict: The loaded index data.
         """
-        with open(filename, "r", encoding="utf-8") as file:
-            index = json.load(file)
+        with open(filename, "rb") as file:
+            index = orjson.loads(file.read())
         return index
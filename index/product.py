@@ -1,35 +1,58 @@
 """This module defines a product class that represents a product with its features and reviews."""
 
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass(slots=True)
 class Product:
     """
     A class to represent a product.
 
     Attributes:
-        url (str): The URL of the product.
+        id (str): The URL of the product.
         title (str): The title of the product.
         description (str): The description of the product.
-        product_features (list): The features of the product.
+        product_features (dict): The features of the product.
         links (list): The links of the product.
-        product_reviews (list): The reviews of the product.
-        id (int): The ID of the product.
+        product_rewiews (list): The reviews of the product.
         variant (str): The variant of the product.
     """
-    def __init__(self, json_line):
-        self.id = json_line["url"]
-        self.title = json_line["title"]
-        self.description = json_line["description"]
-        self.product_features = json_line["product_features"]
-        self.links = json_line["links"]
-        self.product_rewiews = json_line["product_reviews"]
-        self.variant = None
+    id: str
+    title: str
+    description: str
+    product_features: dict
+    links: list
+    product_rewiews: list
+    variant: Optional[str] = None
+
+    @classmethod
+    def from_json(cls, json_line):
+        """
+        Create a product from a parsed JSONL line.
+
+        Args:
+            json_line (dict): The parsed JSONL line.
+
+        Returns:
+            Product: The product.
+        """
+        return cls(
+            id=json_line["url"],
+            title=json_line["title"],
+            description=json_line["description"],
+            product_features=json_line["product_features"],
+            links=json_line["links"],
+            product_rewiews=json_line["product_reviews"],
+        )
 
     def set_variant(self, variant: str):
         """
         Set the product variant.
-        
+
         Args:
             variant (str): The product variant.
-        
+
         Returns:
             None
         """
@@ -38,7 +61,7 @@ class Product:
     def to_json(self):
         """
         Convert the product to a JSON object.
-        
+
         Returns:
             dict: The JSON object representing the product.
         """
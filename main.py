@@ -24,6 +24,7 @@ MAX_PAGES = 50
 POLITENESS = 1
 PRIORITY_WORD = "product"
 USER_AGENT = "*"
+MAX_WORKERS = 10
 
 
 ## --------------- Functions ----------------
@@ -47,6 +48,7 @@ def crawl_url():
         politeness=POLITENESS,
         priority_word=PRIORITY_WORD,
         user_agent=USER_AGENT,
+        max_workers=MAX_WORKERS,
     )
     crawler.crawl()
 
@@ -90,6 +92,7 @@ def search():
     search_engine = SearchEngine()
     search_engine.load_indexes()
     res = search_engine.search()
+    search_engine.close()
     print(json.dumps(res, indent=4))
     logging.info("Results found!")
 
@@ -1,11 +1,20 @@
 """This module defines the search engine class that allows
 to search products based on a query."""
 
-import json
+import copy
+import hashlib
+import heapq
 import logging
 import re
 import math
+import operator
+import os
+import pickle
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import nltk
+import orjson
 from nltk.corpus import stopwords
 from index.indexer import Indexer
 
@@ -22,8 +31,24 @@ class SearchEngine:
     - Execute searches and return ranked results in JSON format.
 
     Attributes:
-        STOPWORDS (list): A list of stopwords used for token filtering.
+        STOPWORDS (frozenset): The stopwords used for token filtering.
         DATA_PATH (str): Path to the data directory containing index files.
+        K1 (float): The default BM25 parameter controlling term frequency saturation.
+        B (float): The default BM25 parameter controlling document length normalization.
+        BM25_FIELDS (tuple): The fields whose BM25 scores are summed.
+        NON_WORD_RE (Pattern): A compiled pattern matching runs of non-word characters.
+        RESULTS_CACHE_SIZE (int): The number of query results kept in the results cache.
+        PARALLEL_RANK_MIN_DOCS (int): The number of matching documents from which they
+            are ranked by a pool of processes.
+        PARALLEL_RANK_CHUNK_SIZE (int): The number of documents ranked by each task of
+            the pool.
+        worker_search_engine (SearchEngine): In a worker process of the ranking pool,
+            the search engine sent by `init_rank_worker`. None in the main process.
+        INDEX_FILES (dict): The JSON file of each index, by attribute name.
+        INDEXES_CACHE_FILE (str): The pickle file caching the loaded indexes.
+        CACHE_VERSION (int): The version of the indexes cache, to increase whenever the
+            way the cached structures are built changes, e.g. the tokenizer.
+        CACHED_ATTRIBUTES (tuple): The attributes saved in the indexes cache.
         indexer (Indexer): An instance of the Indexer class for data parsing and indexing.
         title_index (dict): Inverted index for product titles.
         description_index (dict): Inverted index for product descriptions.
@@ -32,41 +57,122 @@ class SearchEngine:
         brand_index (dict): Inverted index for product brands.
         domain_index (dict): Inverted index for product domains.
         origin_synonyms (dict): Dictionary mapping origin-related terms to their synonyms.
+        synonyms_index (dict): The synonyms of each origin term, including the term itself.
+        indexes (dict): The inverted indexes by field name, filled by `load_indexes`.
+        query_tokens_cache (dict): Tokens with synonyms of the queries of the current search.
+        results_cache (dict): The results of the latest queries, by query tokens and limit.
+        doc_lengths (dict): The number of tokens of the title and description of each
+            document, by document number.
+        avg_doc_lengths (dict): The average number of tokens of the title and description.
+        term_frequencies (dict): The number of occurrences of each token in the title and
+            description of each document.
+        max_origin_phrase_length (int): The number of words of the longest origin.
+        bitmaps (dict): The postings of each inverted index as bitmaps of document numbers.
+        bm25_scores (dict): The BM25 score of each (token, document) pair of each field,
+            computed once with the default K1 and B coefficients.
+        max_review_score (float): The highest review part of the custom score over
+            all documents.
+        rank_executor (ProcessPoolExecutor): The pool of processes ranking large sets
+            of documents, started by the first large query. None until then.
 
     Methods:
         get_matching_docs(query):
             Retrieves matching documents based on the query.
         
-        get_custom_score(query, doc_id):
+        get_custom_score(query_tokens, doc_id):
             Computes a custom ranking score for a given document.
         
-        rank_docs(query, matching_docs):
+        rank_docs(query, matching_docs, limit=None):
             Ranks matching documents using BM25 and custom scoring.
+
+        close():
+            Shuts down the pool of processes ranking large sets of documents.
+
+        init_rank_worker(search_engine):
+            Stores the search engine in a worker process of the ranking pool.
+
+        rank_doc_chunk_in_worker(query_tokens, doc_ids, limit):
+            Ranks a chunk of documents in a worker process of the ranking pool.
+
+        rank_doc_chunk(query_tokens, doc_ids, limit=None):
+            Ranks a chunk of documents.
+
+        get_custom_score_upper_bound(query_tokens):
+            Computes an upper bound of the custom score of any document for a query.
+
+        build_max_review_score():
+            Precomputes the highest review part of the custom score.
+
+        get_bm25_scores(query_tokens, doc_ids):
+            Computes the BM25 score of several documents, term at a time.
         
-        get_doc_length(str):
-            Computes the number of tokens in a given string.
-        
+        build_field_stats():
+            Precomputes the length of the title and description of each document,
+            and the frequency of their tokens.
+
+        get_field_length(doc_id, doc_field):
+            Returns the precomputed length of a field of a document.
+
         get_avg_doc_length(doc_field):
-            Computes the average length of documents in a specific field.
+            Returns the average length of documents in a specific field.
         
         get_freq(token, doc_id, doc_field):
             Retrieves the frequency of a token in a specific document field.
         
-        compute_bm25(query_tokens, product, doc_field, K1=1.5, B=0.75):
-            Computes the BM25 score for a given document and query.
+        compute_term_bm25(token, doc_id, doc_field, index, doc_length, avg_doc_length, k1, b):
+            Computes the BM25 score of a single query token for a document.
+
+        build_bm25_scores():
+            Precomputes the BM25 score of every (token, document) pair of each field.
         
         load_indexes():
-            Loads all necessary indexes from JSON files.
+            Loads all necessary indexes from JSON files, or from the indexes cache.
+
+        load_index_file(attribute):
+            Loads the JSON file of an index.
+
+        get_index_mtimes():
+            Gets the modification times of the index and products files.
+
+        get_cache_fingerprint():
+            Computes a fingerprint of the settings the cached structures depend on.
+
+        load_indexes_cache(mtimes):
+            Loads the indexes from the indexes cache if it is up to date.
+
+        save_indexes_cache(mtimes):
+            Saves the indexes in the indexes cache.
+
+        normalize_positional_index(index):
+            Normalizes the postings of a positional index into sorted positions.
         
-        search(limit=5):
+        search(query=None, limit=5):
             Executes a search query and returns the top results.
         
+        search_batch(queries, limit=5):
+            Executes a batch of search queries and returns the top results of each.
+
+        get_query_results(query, limit=5):
+            Retrieves and ranks the documents matching a query, with caching.
+        
+        build_synonyms_index():
+            Builds the reverse synonyms index of the origin terms.
+        
         get_token_synonyms(token):
             Retrieves synonyms for a given token.
         
         get_query_tokens_with_synonyms(query):
             Tokenizes the query and expands it with synonyms.
         
+        build_bitmaps():
+            Converts the postings of the inverted indexes into bitmaps.
+
+        numbers_to_bitmap(numbers):
+            Converts document numbers into a bitmap.
+
+        bitmap_to_docs(bitmap):
+            Converts a bitmap of document numbers back into document IDs.
+
         filter_partial_match(query_tokens, index_name):
             Filters documents that contain at least one of the query tokens.
         
@@ -76,14 +182,47 @@ class SearchEngine:
         save_query_results(query, results):
             Saves the search query results in a JSON file.
     """
-    nltk.download("stopwords")
-
-    STOPWORDS = stopwords.words("english")
+    try:
+        STOPWORDS = frozenset(stopwords.words("english"))
+    except LookupError:
+        nltk.download("stopwords", quiet=True)
+        STOPWORDS = frozenset(stopwords.words("english"))
     DATA_PATH = "data/TP3"
+    K1 = 1.5
+    B = 0.75
+    BM25_FIELDS = ("title", "description", "origin", "brand", "domain")
+    INDEX_FILES = {
+        "title_index": "title_index.json",
+        "description_index": "description_index.json",
+        "origin_index": "origin_index.json",
+        "reviews_index": "reviews_index.json",
+        "brand_index": "brand_index.json",
+        "domain_index": "domain_index.json",
+        "origin_synonyms": "origin_synonyms.json",
+    }
+    INDEXES_CACHE_FILE = "output/indexes_cache.pkl"
+    CACHE_VERSION = 1
+    CACHED_ATTRIBUTES = (
+        *INDEX_FILES,
+        "max_origin_phrase_length",
+        "doc_lengths",
+        "avg_doc_lengths",
+        "term_frequencies",
+        "indexes",
+        "synonyms_index",
+        "bitmaps",
+        "bm25_scores",
+        "max_review_score",
+    )
+    NON_WORD_RE = re.compile(r"\W+")
+    RESULTS_CACHE_SIZE = 1024
+    PARALLEL_RANK_MIN_DOCS = 50_000
+    PARALLEL_RANK_CHUNK_SIZE = 10_000
+    worker_search_engine = None
 
     def __init__(self):
         self.indexer = Indexer(f"{self.DATA_PATH}/rearranged_products.jsonl")
-        self.indexer.parse_jsonl()
+        self.indexer.load_products()
         self.title_index = None
         self.description_index = None
         self.origin_index = None
@@ -91,26 +230,93 @@ class SearchEngine:
         self.brand_index = None
         self.domain_index = None
         self.origin_synonyms = None
-
-    def search(self, limit=5):
+        self.synonyms_index = {}
+        self.query_tokens_cache = {}
+        self.results_cache = {}
+        self.rank_executor = None
+        self.max_review_score = 0
+        self.doc_lengths = {}
+        self.avg_doc_lengths = {}
+        self.term_frequencies = {}
+        self.indexes = {}
+        self.bm25_scores = {}
+        self.bitmaps = {}
+        self.max_origin_phrase_length = 0
+
+    def search(self, query=None, limit=5):
         """
         Executes a search query, retrieves matching documents, ranks them, and saves the results.
 
         Args:
+            query (str, optional): The search query. Default is None, which asks the user
+                                    for the query in the console.
             limit (int, optional): The maximum number of top results to return. Default is 5.
 
         Returns:
             dict: A dictionary containing search results, including metadata and ranked products.
         """
-        query = input("Enter your query: ")
+        if query is None:
+            query = input("Enter your query: ")
+        self.query_tokens_cache.clear()
+        results = self.get_query_results(query, limit)
+        self.save_query_results(query, results)
+
+        return results
+
+    def search_batch(self, queries, limit=5):
+        """
+        Executes a batch of search queries and saves the results of each of them.
+        All the queries are tokenized and expanded with synonyms once, up front, and
+        the queries expanding to the same tokens are ranked only once.
+
+        Args:
+            queries (list): The search queries.
+            limit (int, optional): The maximum number of top results to return for each
+                                    query. Default is 5.
+
+        Returns:
+            dict: The search results of each query, by query.
+        """
+        self.query_tokens_cache.clear()
+        queries_by_tokens = {}
+        for query in queries:
+            query_tokens = tuple(self.get_query_tokens_with_synonyms(query))
+            queries_by_tokens.setdefault(query_tokens, []).append(query)
+
+        batch_results = {}
+        for same_token_queries in queries_by_tokens.values():
+            results = self.get_query_results(same_token_queries[0], limit)
+            for query in same_token_queries:
+                batch_results[query] = copy.deepcopy(results)
+                self.save_query_results(query, results)
+
+        return batch_results
+
+    def get_query_results(self, query, limit=5):
+        """
+        Retrieves and ranks the documents matching a query. The results are cached by
+        query tokens and limit, so queries with the same tokens reuse them. A copy of
+        the cached results is returned, so that callers cannot modify the cache.
+
+        Args:
+            query (str): The search query.
+            limit (int, optional): The maximum number of top results to return. Default is 5.
+
+        Returns:
+            dict: A dictionary containing search results, including metadata and ranked products.
+        """
+        cache_key = (tuple(self.get_query_tokens_with_synonyms(query)), limit)
+        if cache_key in self.results_cache:
+            return copy.deepcopy(self.results_cache[cache_key])
+
         results = {}
         matching_docs = self.get_matching_docs(query)
         nb_docs = len(self.indexer.products_list)
         nb_filtered_docs = len(matching_docs)
 
-        dict_score = self.rank_docs(query, matching_docs)
+        dict_score = self.rank_docs(query, matching_docs, limit)
         ordered_score = dict(
-            sorted(dict_score.items(), key=lambda item: item[1], reverse=True)[:limit]
+            heapq.nlargest(limit, dict_score.items(), key=operator.itemgetter(1))
         )
 
         results["Total number of documents"] = nb_docs
@@ -122,9 +328,11 @@ class SearchEngine:
             json_prod["score"] = ordered_score[doc]
             results["Products"].append(json_prod)
 
-        self.save_query_results(query, results)
+        if len(self.results_cache) >= self.RESULTS_CACHE_SIZE:
+            del self.results_cache[next(iter(self.results_cache))]
+        self.results_cache[cache_key] = results
 
-        return results
+        return copy.deepcopy(results)
 
     def get_matching_docs(self, query):
         """
@@ -137,27 +345,26 @@ class SearchEngine:
             set: A set of document IDs that match the query based on various indexes.
         """
         query_tokens = self.get_query_tokens_with_synonyms(query)
-        matching_docs = set()
+        matching_docs = 0
         for token in query_tokens:
-            matching_docs.update(self.filter_total_match([token], "brand"))
-        matching_docs.update(self.filter_total_match(query_tokens, "origin"))
-        matching_docs.update(self.filter_total_match(query_tokens, "domain"))
-        matching_docs.update(self.filter_partial_match(query_tokens, "title"))
-        matching_docs.update(self.filter_partial_match(query_tokens, "description"))
-        return matching_docs
-
-    def get_custom_score(self, query, doc_id):
+            matching_docs |= self.filter_total_match([token], "brand")
+        matching_docs |= self.filter_total_match(query_tokens, "origin")
+        matching_docs |= self.filter_total_match(query_tokens, "domain")
+        matching_docs |= self.filter_partial_match(query_tokens, "title")
+        matching_docs |= self.filter_partial_match(query_tokens, "description")
+        return self.bitmap_to_docs(matching_docs)
+
+    def get_custom_score(self, query_tokens, doc_id):
         """
         Computes a custom score for ranking a document based on various factors.
 
         Args:
-            query (str): The search query.
+            query_tokens (list): The query tokens, including synonyms.
             doc_id (str): The document ID for which the score is computed.
 
         Returns:
             float: The computed custom score for the document.
         """
-        query_tokens = self.get_query_tokens_with_synonyms(query)
         score = 0
 
         title_match = sum(
@@ -182,15 +389,15 @@ class SearchEngine:
         desc_pos_score = 0
 
         for token in query_tokens:
-            if token in self.title_index and doc_id in dict(self.title_index[token]):
-                positions = dict(self.title_index[token])[doc_id]
-                first_position = min(positions) if positions else 9999
+            postings = self.title_index.get(token)
+            if postings and doc_id in postings:
+                positions = postings[doc_id]
+                first_position = positions[0] if positions else 9999
                 title_pos_score = 10 / (1 + first_position)
-            if token in self.description_index and doc_id in dict(
-                self.description_index[token]
-            ):
-                positions = dict(self.description_index[token])[doc_id]
-                first_position = min(positions) if positions else 9999
+            postings = self.description_index.get(token)
+            if postings and doc_id in postings:
+                positions = postings[doc_id]
+                first_position = positions[0] if positions else 9999
                 desc_pos_score = 10 / (1 + first_position)
 
         pos_score = title_pos_score * 0.4 + desc_pos_score * 0.6
@@ -198,52 +405,246 @@ class SearchEngine:
 
         return score
 
-    def rank_docs(self, query, matching_docs):
+    def rank_docs(self, query, matching_docs, limit=None):
         """
         Ranks the documents based on a combination of BM25 and custom scoring.
+        Large sets of matching documents are ranked in chunks by a pool of processes,
+        and the best documents of each chunk are merged. The pool is started by the
+        first large query and reused by the next ones, until the indexes are reloaded.
 
         Args:
             query (str): The search query.
             matching_docs (set): A set of document IDs that matched the query.
+            limit (int, optional): The number of best documents to keep. Default is None,
+                                    which keeps all the documents.
 
         Returns:
             dict: A dictionary mapping document IDs to their ranking scores.
         """
         query_tokens = self.get_query_tokens_with_synonyms(query)
+        if len(matching_docs) < SearchEngine.PARALLEL_RANK_MIN_DOCS:
+            return self.rank_doc_chunk(query_tokens, matching_docs, limit)
+
+        doc_ids = list(matching_docs)
+        chunk_size = SearchEngine.PARALLEL_RANK_CHUNK_SIZE
+        chunks = [
+            doc_ids[i : i + chunk_size] for i in range(0, len(doc_ids), chunk_size)
+        ]
+        nb_chunks = len(chunks)
+        if self.rank_executor is None:
+            self.rank_executor = ProcessPoolExecutor(
+                initializer=SearchEngine.init_rank_worker, initargs=(self,)
+            )
+        chunk_scores = self.rank_executor.map(
+            SearchEngine.rank_doc_chunk_in_worker,
+            [query_tokens] * nb_chunks,
+            chunks,
+            [limit] * nb_chunks,
+        )
         scores = {}
-        for doc_id in matching_docs:
-            product = self.indexer.get_product_by_id(doc_id)
-            title_score = self.compute_bm25(query_tokens, product, "title")
-            description_score = self.compute_bm25(query_tokens, product, "description")
-            origin_score = self.compute_bm25(query_tokens, product, "origin")
-            brand_score = self.compute_bm25(query_tokens, product, "brand")
-            domain_score = self.compute_bm25(query_tokens, product, "domain")
-            bm_25_score = (
-                title_score
-                + description_score
-                + origin_score
-                + brand_score
-                + domain_score
+        for chunk_score in chunk_scores:
+            scores.update(chunk_score)
+
+        if limit:
+            scores = dict(
+                heapq.nlargest(limit, scores.items(), key=operator.itemgetter(1))
             )
-            custom_score = self.get_custom_score(query, doc_id)
-            scores[doc_id] = bm_25_score + math.log(max(0.1, custom_score))
         return scores
 
-    def get_doc_length(self, str):
+    def close(self):
+        """
+        Shuts down the pool of processes ranking large sets of documents, if started.
+
+        Returns:
+            None
+        """
+        if self.rank_executor is not None:
+            self.rank_executor.shutdown()
+            self.rank_executor = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["rank_executor"] = None
+        return state
+
+    @staticmethod
+    def init_rank_worker(search_engine):
+        """
+        Stores the search engine in a worker process of `rank_docs`, so that its
+        indexes are sent once per process instead of once per chunk.
+
+        Args:
+            search_engine (SearchEngine): The search engine ranking the documents.
+        """
+        SearchEngine.worker_search_engine = search_engine
+
+    @staticmethod
+    def rank_doc_chunk_in_worker(query_tokens, doc_ids, limit):
+        """
+        Ranks a chunk of documents in a worker process of `rank_docs`.
+
+        Args:
+            query_tokens (list): The query tokens, including synonyms.
+            doc_ids (list): The IDs of the documents of the chunk.
+            limit (int): The number of best documents to keep, or None to keep them all.
+
+        Returns:
+            dict: A dictionary mapping document IDs to their ranking scores.
+        """
+        return SearchEngine.worker_search_engine.rank_doc_chunk(
+            query_tokens, doc_ids, limit
+        )
+
+    def rank_doc_chunk(self, query_tokens, doc_ids, limit=None):
+        """
+        Ranks documents based on a combination of BM25 and custom scoring.
+
+        When a limit is given, the documents are visited by decreasing BM25 score,
+        and the ranking stops as soon as the BM25 score of the next document plus the
+        upper bound of the custom score cannot beat the worst document kept so far,
+        so the custom score of the remaining documents is never computed.
+
+        Args:
+            query_tokens (list): The query tokens, including synonyms.
+            doc_ids (iterable): The IDs of the documents to rank.
+            limit (int, optional): The number of best documents to keep. Default is None,
+                                    which keeps all the documents.
+
+        Returns:
+            dict: A dictionary mapping document IDs to their ranking scores.
         """
-        Calculates the length of a given string in terms of token count.
+        bm_25_scores = self.get_bm25_scores(query_tokens, doc_ids)
+        if not limit:
+            return {
+                doc_id: bm_25_score
+                + math.log(max(0.1, self.get_custom_score(query_tokens, doc_id)))
+                for doc_id, bm_25_score in bm_25_scores.items()
+            }
+
+        custom_upper_bound = math.log(
+            max(0.1, self.get_custom_score_upper_bound(query_tokens))
+        )
+        top_docs = []
+        for doc_id, bm_25_score in sorted(
+            bm_25_scores.items(), key=operator.itemgetter(1), reverse=True
+        ):
+            if (
+                len(top_docs) == limit
+                and bm_25_score + custom_upper_bound < top_docs[0][0]
+            ):
+                break
+            score = bm_25_score + math.log(
+                max(0.1, self.get_custom_score(query_tokens, doc_id))
+            )
+            if len(top_docs) < limit:
+                heapq.heappush(top_docs, (score, doc_id))
+            else:
+                heapq.heappushpop(top_docs, (score, doc_id))
+
+        return {doc_id: score for score, doc_id in top_docs}
+
+    def get_custom_score_upper_bound(self, query_tokens):
+        """
+        Computes an upper bound of the custom score of any document for a query: each
+        query token matches the title and the description, the reviews are the best
+        ones of the catalogue, and every position score is the highest possible.
 
         Args:
-            str (str): The text whose length needs to be calculated.
+            query_tokens (list): The query tokens, including synonyms.
+
+        Returns:
+            float: The upper bound of the custom score.
+        """
+        return 3 * len(query_tokens) + self.max_review_score + 10
+
+    def build_max_review_score(self):
+        """
+        Precomputes the highest review part of the custom score over all documents,
+        used by `get_custom_score_upper_bound`.
 
         Returns:
-            int: The number of tokens in the given string.
+            None
+        """
+        self.max_review_score = max(
+            (
+                review_data["mean_mark"] * 2 + math.log(1 + review_data["total_reviews"])
+                for review_data in (self.reviews_index or {}).values()
+            ),
+            default=0,
+        )
+
+    def get_bm25_scores(self, query_tokens, doc_ids):
         """
-        return len(self.indexer.tokenize(str))
+        Computes the BM25 score of several documents at once, term at a time: the
+        precomputed scores of each query token are added to the documents of its
+        postings, instead of looking up every token for every document.
+
+        Args:
+            query_tokens (list): The query tokens, including synonyms.
+            doc_ids (iterable): The IDs of the documents to score.
+
+        Returns:
+            dict: A dictionary mapping document IDs to their BM25 scores summed over
+                all the fields.
+        """
+        scores = dict.fromkeys(doc_ids, 0)
+        for doc_field in self.BM25_FIELDS:
+            if doc_field not in self.bm25_scores:
+                continue
+            field_scores = self.bm25_scores[doc_field]
+            doc_field_scores = {}
+            for token in query_tokens:
+                if token not in field_scores:
+                    continue
+                for doc_id, token_score in field_scores[token].items():
+                    if doc_id in scores:
+                        doc_field_scores[doc_id] = (
+                            doc_field_scores.get(doc_id, 0) + token_score
+                        )
+            for doc_id, field_score in doc_field_scores.items():
+                scores[doc_id] += field_score
+        return scores
+
+    def build_field_stats(self):
+        """
+        Tokenizes the title and description of every product once, and stores their
+        lengths by document number, the average length of each field, and the
+        frequency of each token in each document.
+        """
+        self.doc_lengths = {"title": array("i"), "description": array("i")}
+        self.term_frequencies = {"title": {}, "description": {}}
+        for product in self.indexer.products_list:
+            for doc_field, text in (
+                ("title", product.title),
+                ("description", product.description),
+            ):
+                tokens = self.indexer.tokenize(text)
+                self.doc_lengths[doc_field].append(len(tokens))
+                field_frequencies = self.term_frequencies[doc_field]
+                for token, freq in Counter(tokens).items():
+                    field_frequencies.setdefault(token, {})[product.id] = freq
+
+        self.avg_doc_lengths = {
+            doc_field: sum(lengths) / len(lengths)
+            for doc_field, lengths in self.doc_lengths.items()
+        }
+
+    def get_field_length(self, doc_id, doc_field):
+        """
+        Returns the precomputed length of a field of a document.
+
+        Args:
+            doc_id (str): The document ID.
+            doc_field (str): The field, "title" or "description".
+
+        Returns:
+            int: The number of tokens of the field.
+        """
+        return self.doc_lengths[doc_field][self.indexer.doc_numbers[doc_id]]
 
     def get_avg_doc_length(self, doc_field):
         """
-        Computes the average document length for a given field (title or description).
+        Returns the average document length for a given field (title or description).
 
         Args:
             doc_field (str): The field for which the average document length is computed.
@@ -255,19 +656,9 @@ class SearchEngine:
         Raises:
             ValueError: If an invalid `doc_field` is provided.
         """
-        list_products = self.indexer.products_list
-        avg_len = []
-
-        if doc_field == "title":
-            for product in list_products:
-                avg_len.append(self.get_doc_length(product.title))
-        elif doc_field == "description":
-            for product in list_products:
-                avg_len.append(self.get_doc_length(product.description))
-        else:
+        if doc_field not in self.avg_doc_lengths:
             raise ValueError("Invalid index name.")
-
-        return sum(avg_len) / len(avg_len)
+        return self.avg_doc_lengths[doc_field]
 
     def get_freq(self, token, doc_id, doc_field):
         """
@@ -285,149 +676,302 @@ class SearchEngine:
         Raises:
             ValueError: If an invalid `doc_field` is provided.
         """
-        if doc_field == "title":
-            title = self.indexer.get_product_by_id(doc_id).title
-            title_tokens = self.indexer.tokenize(title)
-            return title_tokens.count(token)
-        if doc_field == "description":
-            description = self.indexer.get_product_by_id(doc_id).description
-            description_tokens = self.indexer.tokenize(description)
-            return description_tokens.count(token)
-        if doc_field == "origin":
-            origin = [
-                self.indexer.get_product_by_id(doc_id).product_features["made in"]
-            ]
-            return origin.count(token)
-        if doc_field == "brand":
-            brand = [self.indexer.get_product_by_id(doc_id).product_features["brand"]]
-            return brand.count(token)
+        if doc_field in ("title", "description"):
+            return self.term_frequencies[doc_field].get(token, {}).get(doc_id, 0)
+        if doc_field in ("origin", "brand"):
+            features = self.indexer.get_product_by_id(doc_id).product_features
+            feature = "made in" if doc_field == "origin" else "brand"
+            return int(features[feature] == token)
         if doc_field == "domain":
             return 0
         raise ValueError("Invalid document field.")
 
-    def compute_bm25(self, query_tokens, product, doc_field, k1=1.5, b=0.75):
+    def compute_term_bm25(
+        self, token, doc_id, doc_field, index, doc_length, avg_doc_length, k1, b
+    ):
         """
-        Computes the BM25 score for a document based on a query.
+        Computes the BM25 score of a single query token for a document.
 
         Args:
-            query_tokens (list): A list of query tokens.
-            product (object): The product object containing document information.
-            doc_field (str): The field to compute BM25 for ("title", "description",
-                            "origin", "brand", or "domain").
-            k1 (float, optional): BM25 parameter controlling term frequency saturation.
-                                    Default is 1.5.
-            b (float, optional): BM25 parameter controlling document length normalization.
-                                    Default is 0.75.
+            token (str): The query token, present in the index for this document.
+            doc_id (str): The document ID.
+            doc_field (str): The field the index belongs to.
+            index (dict): The index of the field.
+            doc_length (int): The length of the field in the document.
+            avg_doc_length (float): The average length of the field.
+            k1 (float): BM25 parameter controlling term frequency saturation.
+            b (float): BM25 parameter controlling document length normalization.
 
         Returns:
-            float: The BM25 score for the document.
-
-        Raises:
-            ValueError: If an invalid `doc_field` is provided.
+            float: The BM25 score of the token for the document.
         """
-        if doc_field == "title":
-            index = self.title_index
-            doc_length = self.get_doc_length(product.title)
-            avg_doc_length = self.get_avg_doc_length("title")
-        elif doc_field == "description":
-            index = self.description_index
-            doc_length = self.get_doc_length(product.description)
-            avg_doc_length = self.get_avg_doc_length("description")
-        elif doc_field == "origin":
-            index = self.origin_index
-            doc_length = 1
-            avg_doc_length = 1
-        elif doc_field == "brand":
-            index = self.brand_index
-            doc_length = 1
-            avg_doc_length = 1
-        elif doc_field == "domain":
-            index = self.domain_index
-            doc_length = 1
-            avg_doc_length = 1
-        else:
-            raise ValueError("Invalid document field.")
-
-        doc_id = product.id
         total_docs = len(self.indexer.products_list)
-        score = 0
-        for token in query_tokens:
-            if token in index and doc_id in index[token]:
-                freq = self.get_freq(token, doc_id, doc_field)
-                doc_freq = len(index[token])
-                idf = math.log((total_docs - doc_freq + 0.5) / (doc_freq + 0.5) + 1)
-                numerator = freq * (k1 + 1)
-                denominator = freq + k1 * (1 - b + b * (doc_length / avg_doc_length))
-                score += idf * (numerator / denominator)
-        return score
+        freq = self.get_freq(token, doc_id, doc_field)
+        doc_freq = len(index[token])
+        idf = math.log((total_docs - doc_freq + 0.5) / (doc_freq + 0.5) + 1)
+        numerator = freq * (k1 + 1)
+        denominator = freq + k1 * (1 - b + b * (doc_length / avg_doc_length))
+        return idf * (numerator / denominator)
+
+    def build_bm25_scores(self):
+        """
+        Precomputes the BM25 score of every (token, document) pair of each field with
+        the default K1 and B coefficients, so that scoring a document at query time
+        only sums a few dictionary lookups.
+        """
+        doc_numbers = self.indexer.doc_numbers
+        self.bm25_scores = {}
+
+        for doc_field, index in self.indexes.items():
+            if index is None:
+                continue
+
+            if doc_field in ("title", "description"):
+                avg_doc_length = self.get_avg_doc_length(doc_field)
+            else:
+                avg_doc_length = 1
+
+            field_scores = {}
+            for token, postings in index.items():
+                token_scores = {}
+                for doc_id in postings:
+                    if doc_id not in doc_numbers:
+                        continue
+                    if doc_field in ("title", "description"):
+                        doc_length = self.get_field_length(doc_id, doc_field)
+                    else:
+                        doc_length = 1
+                    token_scores[doc_id] = self.compute_term_bm25(
+                        token,
+                        doc_id,
+                        doc_field,
+                        index,
+                        doc_length,
+                        avg_doc_length,
+                        self.K1,
+                        self.B,
+                    )
+                field_scores[token] = token_scores
+            self.bm25_scores[doc_field] = field_scores
 
     def load_indexes(self):
         """
-        Loads all indexes from JSON files and stores them in instance variables.
+        Loads all indexes from JSON files and stores them in instance variables, then
+        builds the field statistics, the synonyms index, the bitmaps and the BM25
+        scores. The loaded and derived structures are cached in a pickle file, and
+        reused as long as none of the index files and products have been modified
+        and the settings they depend on are unchanged (see `get_cache_fingerprint`),
+        so that neither the index files nor the products are parsed or tokenized again.
 
         Logs:
             - Logs success messages if indexes are loaded.
             - Logs error messages if any index file is missing.
         """
-        try:
-            self.title_index = self.indexer.load_index_from_json(
-                f"{self.DATA_PATH}/title_index.json"
+        self.close()
+        self.query_tokens_cache.clear()
+        self.results_cache.clear()
+        mtimes = self.get_index_mtimes()
+        if self.load_indexes_cache(mtimes):
+            return
+
+        with ThreadPoolExecutor(max_workers=len(self.INDEX_FILES)) as executor:
+            loaded_indexes = executor.map(self.load_index_file, self.INDEX_FILES)
+            for attribute, index in zip(self.INDEX_FILES, loaded_indexes):
+                setattr(self, attribute, index)
+
+        if self.title_index is not None:
+            self.title_index = self.normalize_positional_index(self.title_index)
+        if self.description_index is not None:
+            self.description_index = self.normalize_positional_index(
+                self.description_index
             )
-            logging.info("Title index loaded.")
-        except FileNotFoundError:
-            logging.error("Title index not found.")
 
-        try:
-            self.description_index = self.indexer.load_index_from_json(
-                f"{self.DATA_PATH}/description_index.json"
+        if self.origin_index:
+            self.max_origin_phrase_length = max(
+                len(origin.split()) for origin in self.origin_index
             )
-            logging.info("Description index loaded.")
-        except FileNotFoundError:
-            logging.error("Description index not found.")
 
-        try:
-            self.origin_index = self.indexer.load_index_from_json(
-                f"{self.DATA_PATH}/origin_index.json"
-            )
-            logging.info("Origin index loaded.")
-        except FileNotFoundError:
-            logging.error("Origin index not found.")
+        self.indexes = {
+            "title": self.title_index,
+            "description": self.description_index,
+            "origin": self.origin_index,
+            "brand": self.brand_index,
+            "domain": self.domain_index,
+        }
+
+        self.build_field_stats()
+        self.build_synonyms_index()
+        self.build_bitmaps()
+        self.build_bm25_scores()
+        self.build_max_review_score()
+        logging.info("Bitmaps and BM25 scores computed.")
+        self.save_indexes_cache(mtimes)
+
+    def load_index_file(self, attribute):
+        """
+        Loads the JSON file of an index.
 
-        try:
-            self.reviews_index = self.indexer.load_index_from_json(
-                f"{self.DATA_PATH}/reviews_index.json"
-            )
-            logging.info("Reviews index loaded.")
-        except FileNotFoundError:
-            logging.error("Reviews index not found.")
+        Args:
+            attribute (str): The name of the attribute storing the index, a key of
+                            `INDEX_FILES`.
 
+        Returns:
+            dict: The loaded index, or None if the file is missing.
+        """
+        name = attribute.replace("_", " ").capitalize()
         try:
-            self.brand_index = self.indexer.load_index_from_json(
-                f"{self.DATA_PATH}/brand_index.json"
+            index = self.indexer.load_index_from_json(
+                f"{self.DATA_PATH}/{self.INDEX_FILES[attribute]}"
             )
-            logging.info("Brand index loaded.")
+            logging.info("%s loaded.", name)
+            return index
         except FileNotFoundError:
-            logging.error("Brand index not found.")
+            logging.error("%s not found.", name)
+            return None
+
+    def get_index_mtimes(self):
+        """
+        Gets the modification times of the index files and of the products file,
+        used to check whether the indexes cache is up to date.
+
+        Returns:
+            dict: The modification time of each file, or None if the file is missing.
+        """
+        files = [
+            f"{self.DATA_PATH}/{filename}" for filename in self.INDEX_FILES.values()
+        ]
+        files.append(self.indexer.jsonl_file)
+        return {
+            file: os.path.getmtime(file) if os.path.exists(file) else None
+            for file in files
+        }
+
+    def get_cache_fingerprint(self):
+        """
+        Computes a fingerprint of the settings the cached structures depend on besides
+        the data files: the cache version, the BM25 coefficients and fields, and the
+        stopwords removed by the tokenizer.
+
+        Returns:
+            tuple: The fingerprint of the indexes cache.
+        """
+        stopwords_hash = hashlib.sha256(
+            "\n".join(sorted(Indexer.STOPWORDS)).encode("utf-8")
+        ).hexdigest()
+        return (
+            self.CACHE_VERSION,
+            self.K1,
+            self.B,
+            tuple(self.BM25_FIELDS),
+            stopwords_hash,
+        )
+
+    def load_indexes_cache(self, mtimes):
+        """
+        Loads the indexes and their derived structures from the indexes cache.
+
+        Args:
+            mtimes (dict): The current modification times of the index files.
+
+        Returns:
+            bool: True if the cache was up to date and has been loaded, otherwise False.
+        """
+        cache_file = self.INDEXES_CACHE_FILE
+        if not os.path.exists(cache_file):
+            return False
 
         try:
-            self.domain_index = self.indexer.load_index_from_json(
-                f"{self.DATA_PATH}/domain_index.json"
-            )
-            logging.info("Domain index loaded.")
-        except FileNotFoundError:
-            logging.error("Domain index not found.")
+            with open(cache_file, "rb") as file:
+                cache = pickle.load(file)
+            if (
+                cache["mtimes"] != mtimes
+                or cache["fingerprint"] != self.get_cache_fingerprint()
+            ):
+                return False
+            for attribute in self.CACHED_ATTRIBUTES:
+                setattr(self, attribute, cache[attribute])
+        except Exception:
+            # A stale cache may fail to unpickle in many ways, e.g. after a class
+            # it refers to changed, so the indexes are loaded again in any case.
+            logging.error("Failed to load the indexes cache %s", cache_file)
+            return False
+
+        logging.info("Indexes loaded from %s.", cache_file)
+        return True
+
+    def save_indexes_cache(self, mtimes):
+        """
+        Saves the indexes and their derived structures in the indexes cache.
+
+        Args:
+            mtimes (dict): The modification times of the index files they were loaded from.
 
+        Returns:
+            None
+        """
+        cache_file = self.INDEXES_CACHE_FILE
+        cache = {
+            attribute: getattr(self, attribute) for attribute in self.CACHED_ATTRIBUTES
+        }
+        cache["mtimes"] = mtimes
+        cache["fingerprint"] = self.get_cache_fingerprint()
         try:
-            self.origin_synonyms = self.indexer.load_index_from_json(
-                f"{self.DATA_PATH}/origin_synonyms.json"
+            if not os.path.exists(os.path.dirname(cache_file)):
+                os.makedirs(os.path.dirname(cache_file))
+            with open(cache_file, "wb") as file:
+                pickle.dump(cache, file)
+        except OSError:
+            logging.error("Failed to save the indexes cache %s", cache_file)
+
+    def normalize_positional_index(self, index):
+        """
+        Normalizes the postings of a positional index so that each token maps to a
+        dictionary of document IDs to sorted positions, whether the postings were
+        saved as a dictionary or as a list of (document ID, positions) pairs.
+
+        Args:
+            index (dict): The loaded positional index.
+
+        Returns:
+            dict: The normalized positional index.
+        """
+        return {
+            token: {
+                doc_id: sorted(positions)
+                for doc_id, positions in dict(postings).items()
+            }
+            for token, postings in index.items()
+        }
+
+    def build_synonyms_index(self):
+        """
+        Builds a reverse synonyms index mapping every origin term, whether it is a key
+        of the synonyms mapping or one of its synonyms, to the list of its synonyms
+        including itself, so that looking up a token does not scan the whole mapping.
+
+        Returns:
+            None
+        """
+        self.synonyms_index = {}
+        if not self.origin_synonyms:
+            return
+
+        for origin, synonyms in self.origin_synonyms.items():
+            key = origin.lower()
+            self.synonyms_index[key] = list(
+                dict.fromkeys([key] + [syn.lower() for syn in synonyms])
             )
-            logging.info("Origin synonyms loaded.")
-        except FileNotFoundError:
-            logging.error("Origin synonyms not found.")
+
+        for origin, synonyms in self.origin_synonyms.items():
+            for syn in synonyms:
+                if syn not in self.synonyms_index:
+                    self.synonyms_index[syn] = list(
+                        dict.fromkeys([syn] + synonyms + [origin])
+                    )
 
     def get_token_synonyms(self, token):
         """
-        Retrieves all synonyms for a given token using the origin synonyms mapping.
+        Retrieves all synonyms for a given token using the reverse synonyms index.
 
         Args:
             token (str): The token for which synonyms should be retrieved.
@@ -435,24 +979,15 @@ class SearchEngine:
         Returns:
             list: A list of synonyms, including the token itself.
         """
-        synonyms_mapping = self.origin_synonyms
         token = token.lower()
-        tokens = [token]
-        if token in synonyms_mapping:
-            for syn in synonyms_mapping[token]:
-                tokens.append(syn.lower())
-        else:
-            list_syn = list(synonyms_mapping.values())
-            for i in range(len(list_syn)):
-                if token in list_syn[i]:
-                    tokens.extend(list_syn[i])
-                    tokens.append(list(synonyms_mapping.keys())[i])
-                    break
-        return list(set(tokens))
+        return self.synonyms_index.get(token, [token])
 
     def get_query_tokens_with_synonyms(self, query):
         """
-        Tokenizes a query and expands it with synonyms.
+        Tokenizes a query and expands it with synonyms. Stopwords are removed here
+        once, so the filters do not need to check them, and repeated tokens are
+        dropped in order, so each token is scored once. The result is cached
+        until the next search.
 
         Args:
             query (str): The raw search query.
@@ -460,14 +995,82 @@ class SearchEngine:
         Returns:
             list: A list of query tokens, including synonyms.
         """
+        if query in self.query_tokens_cache:
+            return self.query_tokens_cache[query]
+
         query_tokens = self.indexer.tokenize(query)
         query_tokens_with_synonym = []
         for token in query_tokens:
             query_tokens_with_synonym.extend(self.get_token_synonyms(token))
-        query_tokens = query_tokens_with_synonym
+        query_tokens = [
+            token
+            for token in dict.fromkeys(query_tokens_with_synonym)
+            if token not in SearchEngine.STOPWORDS
+        ]
 
+        self.query_tokens_cache[query] = query_tokens
         return query_tokens
 
+    def build_bitmaps(self):
+        """
+        Converts the postings of the inverted indexes into bitmaps, stored as Python
+        integers whose bit n is set when the document number n is in the postings.
+        Unions and intersections of postings then run on whole machine words
+        instead of hashing document IDs one by one.
+        """
+        doc_numbers = self.indexer.doc_numbers
+        self.bitmaps = {}
+        for index_name, index in self.indexes.items():
+            if index is None:
+                continue
+            index_bitmaps = {}
+            for token, postings in index.items():
+                numbers = [
+                    doc_numbers[doc_id] for doc_id in postings if doc_id in doc_numbers
+                ]
+                index_bitmaps[token] = self.numbers_to_bitmap(numbers)
+            self.bitmaps[index_name] = index_bitmaps
+
+    def numbers_to_bitmap(self, numbers):
+        """
+        Converts document numbers into a bitmap. The bits are set in a byte array,
+        which is converted into an integer once, instead of allocating a new integer
+        for every document.
+
+        Args:
+            numbers (list): The document numbers.
+
+        Returns:
+            int: The bitmap of the document numbers.
+        """
+        if not numbers:
+            return 0
+        bits = bytearray(max(numbers) // 8 + 1)
+        for number in numbers:
+            bits[number >> 3] |= 1 << (number & 7)
+        return int.from_bytes(bits, "little")
+
+    def bitmap_to_docs(self, bitmap):
+        """
+        Converts a bitmap of document numbers back into document IDs. The bitmap is
+        written once as a binary string, lowest bit first, which is scanned for its
+        set bits.
+
+        Args:
+            bitmap (int): The bitmap of document numbers.
+
+        Returns:
+            set: The IDs of the documents of the bitmap.
+        """
+        products_list = self.indexer.products_list
+        bits = bin(bitmap)[:1:-1]
+        docs = set()
+        number = bits.find("1")
+        while number != -1:
+            docs.add(products_list[number].id)
+            number = bits.find("1", number + 1)
+        return docs
+
     def filter_partial_match(self, query_tokens, index_name):
         """
         Retrieves documents that partially match at least one of the query tokens.
@@ -475,33 +1078,22 @@ class SearchEngine:
         Args:
             query_tokens (list): A list of query tokens.
             index_name (str): The index to search in ("title", "description", "origin",
-                            "reviews", "brand", or "domain").
+                            "brand", or "domain").
 
         Returns:
-            set: A set of document IDs that contain at least one of the query tokens.
+            int: A bitmap of the documents that contain at least one of the query tokens.
 
         Raises:
             ValueError: If an invalid `index_name` is provided.
         """
-        matching_docs = set()
-        if index_name == "title":
-            index = self.title_index
-        elif index_name == "description":
-            index = self.description_index
-        elif index_name == "origin":
-            index = self.origin_index
-        elif index_name == "reviews":
-            index = self.reviews_index
-        elif index_name == "brand":
-            index = self.brand_index
-        elif index_name == "domain":
-            index = self.domain_index
-        else:
+        if index_name not in self.bitmaps:
             raise ValueError("Invalid index name.")
+        bitmaps = self.bitmaps[index_name]
 
+        matching_docs = 0
         for token in query_tokens:
-            if token in index:
-                matching_docs.update(index[token])
+            if token in bitmaps:
+                matching_docs |= bitmaps[token]
         return matching_docs
 
     def filter_total_match(self, query_tokens, index_name):
@@ -509,7 +1101,8 @@ class SearchEngine:
         Retrieves documents that contain all the query tokens.
 
         Special Handling:
-            - For "origin", it checks for multi-word matches in the index.
+            - For "origin", it checks for multi-word matches in the index. Only phrases
+              no longer than the longest origin in the index are tried.
 
         Args:
             query_tokens (list): A list of query tokens.
@@ -517,57 +1110,36 @@ class SearchEngine:
                         "brand", or "domain").
 
         Returns:
-            set: A set of document IDs that contain all the query tokens.
+            int: A bitmap of the documents that contain all the query tokens.
 
         Raises:
             ValueError: If an invalid `index_name` is provided.
         """
-        matching_docs = None
-        if index_name == "title":
-            index = self.title_index
-        elif index_name == "description":
-            index = self.description_index
-        elif index_name == "origin":
-            index = self.origin_index
-        elif index_name == "reviews":
-            index = self.reviews_index
-        elif index_name == "brand":
-            index = self.brand_index
-        elif index_name == "domain":
-            index = self.domain_index
-        else:
+        if index_name not in self.bitmaps:
             raise ValueError("Invalid index name.")
+        bitmaps = self.bitmaps[index_name]
 
         if index_name == "origin":
-            found_origin = None
+            found_origin = 0
 
             for i in range(len(query_tokens)):
-                for j in range(i + 1, len(query_tokens) + 1):
+                last = min(i + self.max_origin_phrase_length, len(query_tokens))
+                for j in range(i + 1, last + 1):
                     phrase = " ".join(query_tokens[i:j])
-                    if phrase in index:
-                        token_docs = set(index[phrase])
-                        if found_origin is None:
-                            found_origin = token_docs
-                        else:
-                            found_origin = found_origin.union(token_docs)
-
-            if found_origin is not None:
-                matching_docs = found_origin
-                return matching_docs
-            return set()
+                    if phrase in bitmaps:
+                        found_origin |= bitmaps[phrase]
 
+            return found_origin
+
+        matching_docs = None
         for token in query_tokens:
-            if token in SearchEngine.STOPWORDS:
-                continue
-            if token in index:
-                token_docs = set(index[token])
-                if matching_docs is None:
-                    matching_docs = token_docs
-                else:
-                    matching_docs = matching_docs.intersection(token_docs)
+            if token not in bitmaps:
+                return 0
+            if matching_docs is None:
+                matching_docs = bitmaps[token]
             else:
-                return set()
-        return matching_docs if matching_docs is not None else set()
+                matching_docs &= bitmaps[token]
+        return matching_docs if matching_docs is not None else 0
 
     def save_query_results(self, query, results):
         """
@@ -583,7 +1155,8 @@ class SearchEngine:
         File Output:
             - Saves the results in `output/search/{query}.json`.
         """
-        query_f = re.sub("\W+", " ", query)
-        query_f = query_f.replace(" ", "_")
-        with open(f"output/search/{query_f}.json", "w", encoding="utf-8") as file:
-            json.dump(results, file, indent=4)
+        query_f = SearchEngine.NON_WORD_RE.sub("_", query)
+        if not os.path.exists("output/search"):
+            os.makedirs("output/search")
+        with open(f"output/search/{query_f}.json", "wb") as file:
+            file.write(orjson.dumps(results, option=orjson.OPT_INDENT_2))
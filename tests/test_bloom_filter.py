@@ -0,0 +1,23 @@
+"""Tests for the BloomFilter class and its methods."""
+
+from crawler.bloom_filter import BloomFilter
+
+
+def test_bloom_filter_contains_added_items():
+    """Tests that every added item is reported as present."""
+    bloom = BloomFilter(capacity=100)
+    urls = [f"https://example.com/product/{i}" for i in range(100)]
+    for url in urls:
+        bloom.add(url)
+
+    assert all(url in bloom for url in urls)
+    assert len(bloom) == 100
+
+
+def test_bloom_filter_rejects_unseen_items():
+    """Tests that items never added are reported as absent."""
+    bloom = BloomFilter(capacity=100)
+    for i in range(100):
+        bloom.add(f"https://example.com/product/{i}")
+
+    assert not any(f"https://example.com/other/{i}" in bloom for i in range(1000))
@@ -1,10 +1,28 @@
 """Tests for the Crawler class and its methods."""
 
+import time
+from urllib import robotparser
+import pytest
 import requests_mock
-from bs4 import BeautifulSoup
+from selectolax.lexbor import LexborHTMLParser
 from crawler.crawler import Crawler
 
 
+@pytest.fixture(name="offline_robots")
+def fixture_offline_robots(tmp_path, monkeypatch):
+    """
+    Pre-seeds the robots cache with an empty robots.txt file for example.com, so
+    that the crawler does not fetch the live file, and runs the test in a temporary
+    directory so that the project's output is not touched.
+    """
+    monkeypatch.chdir(tmp_path)
+    parser = robotparser.RobotFileParser()
+    parser.parse([])
+    monkeypatch.setattr(
+        Crawler, "robots_cache", {"example.com": (parser, time.time())}
+    )
+
+
 def test_is_allowed_to_crawl():
     """
     Test the `is_allowed_to_crawl` method to ensure it correctly determines if a URL 
@@ -37,13 +55,13 @@ def test_is_not_allowed_to_crawl():
 def test_parse_html():
     """
     Test the `parse_html` method to verify that it correctly parses HTML content 
-    and returns a BeautifulSoup object.
+    and returns a selectolax tree.
 
     This test uses a mocked HTTP response with a sample HTML content and checks 
     if the title and first paragraph are correctly parsed.
 
     Asserts:
-        - The parsed content is an instance of BeautifulSoup.
+        - The parsed content is an instance of LexborHTMLParser.
         - The title of the page matches the expected value.
         - The first paragraph's text matches the expected value.
     """
@@ -53,11 +71,11 @@ def test_parse_html():
 
     with requests_mock.Mocker() as m:
         m.get("https://example.com", text=html)
-        soup = crawler.parse_html("https://example.com")
+        tree = crawler.parse_html("https://example.com")
 
-        assert isinstance(soup, BeautifulSoup)
-        assert soup.title.string == "Test Page"
-        assert soup.p.text == "Hello World"
+        assert isinstance(tree, LexborHTMLParser)
+        assert tree.css_first("title").text() == "Test Page"
+        assert tree.css_first("p").text() == "Hello World"
 
 
 def test_extract_page_content():
@@ -93,3 +111,79 @@ def test_extract_page_content():
         assert content["first_paragraph"] == "First paragraph"
         assert "https://example.com/link1" in content["links"]
         assert "https://external.com" in content["links"]
+
+
+def test_parse_html_sends_user_agent(offline_robots):
+    """
+    Test that `parse_html` goes through the crawler's persistent session,
+    which identifies itself with the configured user agent.
+
+    Asserts:
+        - The request is sent with the crawler's user agent.
+    """
+    crawler = Crawler("https://example.com", user_agent="TestBot")
+
+    with requests_mock.Mocker() as m:
+        m.get("https://example.com", text="<html></html>")
+        crawler.parse_html("https://example.com")
+
+        assert m.last_request.headers["User-Agent"] == "TestBot"
+
+
+def test_extract_page_content_skips_non_html(offline_robots):
+    """
+    Test that `extract_page_content` does not parse responses whose
+    Content-Type is not HTML.
+
+    Asserts:
+        - No content is returned for a PDF document.
+    """
+    crawler = Crawler("https://example.com")
+
+    with requests_mock.Mocker() as m:
+        m.get(
+            "https://example.com/file.pdf",
+            content=b"%PDF-1.4",
+            headers={"Content-Type": "application/pdf"},
+        )
+
+        assert crawler.extract_page_content("https://example.com/file.pdf") is None
+
+
+def test_crawl_fetches_each_url_once(tmp_path, monkeypatch):
+    """
+    Test that `crawl` fetches every page once, even when the pages link to each
+    other several times.
+
+    The robots.txt file of the site is pre-seeded in the robots cache, and the
+    crawl runs in a temporary directory so that its results do not overwrite
+    the project's output.
+
+    Asserts:
+        - Every page of the site is crawled.
+        - Every page is requested exactly once.
+    """
+    monkeypatch.chdir(tmp_path)
+    parser = robotparser.RobotFileParser()
+    parser.parse([])
+    monkeypatch.setattr(
+        Crawler, "robots_cache", {"example.com": (parser, time.time())}
+    )
+    pages = {
+        "https://example.com/": ["/a", "/b", "/a"],
+        "https://example.com/a": ["/", "/b", "https://example.com/a"],
+        "https://example.com/b": ["/a", "/b", "https://external.com"],
+    }
+
+    with requests_mock.Mocker() as m:
+        for url, links in pages.items():
+            html = "".join(f'<a href="{link}">link</a>' for link in links)
+            m.get(url, text=f"<html><body>{html}</body></html>")
+
+        crawler = Crawler("https://example.com/", max_pages=10, politeness=0.001)
+        crawler.crawl()
+
+        requested_urls = [request.url for request in m.request_history]
+
+    assert crawler.pages_visited == len(pages)
+    assert sorted(requested_urls) == sorted(pages)
@@ -1,5 +1,6 @@
 """Tests for the Indexer class and its methods."""
 
+import shutil
 from index.indexer import Indexer
 
 
@@ -50,3 +51,77 @@ def test_build_features_index():
     brand = "chocodelight"
 
     assert brand in index
+
+
+def test_build_features_indexes():
+    """Tests building several features indexes in a single pass."""
+    indexer = Indexer("data/products.jsonl")
+    indexer.parse_jsonl()
+    indexes = indexer.build_features_indexes(["brand", "made in"])
+    url = "https://web-scraping.dev/product"
+    candy_variants = [
+        f"?variant={flavor}-{size}"
+        for flavor in ("cherry", "orange")
+        for size in ("small", "medium", "large")
+    ]
+    shoe_variants = [
+        f"?variant={color}{size}" for color in ("black", "white") for size in (40, 41, 42)
+    ]
+
+    assert set(indexes) == {"brand", "made in"}
+    assert len(indexes["brand"]) == 8
+    assert set(indexes["brand"]["chocodelight"]) == {
+        f"{url}/{product}{variant}"
+        for product in (1, 13, 25)
+        for variant in ["", *candy_variants]
+    }
+    assert set(indexes["made in"]) == {"italy", "usa"}
+    assert set(indexes["made in"]["italy"]) == {
+        f"{url}/{product}{variant}"
+        for product in (11, 23)
+        for variant in ["", *shoe_variants]
+    }
+
+
+def test_build_all_indexes():
+    """Tests that the single pass builder matches the dedicated index builders."""
+    indexer = Indexer("data/products.jsonl")
+    indexer.parse_jsonl()
+    features_list = ["brand", "made in", "material", "colors"]
+    indexes = indexer.build_all_indexes(features_list)
+
+    assert indexes["reviews"] == indexer.build_reviews_index()
+    for feature in features_list:
+        assert {
+            token: set(ids) for token, ids in indexes["features"][feature].items()
+        } == {
+            token: set(ids)
+            for token, ids in indexer.build_features_index(feature).items()
+        }
+    assert indexes["title"] == indexer.build_title_positional_index()
+    assert indexes["description"] == indexer.build_desc_positional_index()
+    assert indexes["title"]["chocolate"]["https://web-scraping.dev/product/1"] == [2]
+
+
+def test_get_product_by_id():
+    """Tests retrieving a product by its ID."""
+    indexer = Indexer("data/products.jsonl")
+    indexer.parse_jsonl()
+    url = "https://web-scraping.dev/product/1"
+
+    assert indexer.get_product_by_id(url).id == url
+    assert indexer.get_product_by_id("https://web-scraping.dev/unknown") is None
+
+
+def test_load_products_with_stale_cache(tmp_path):
+    """Tests that a products cache which cannot be unpickled is replaced."""
+    jsonl_file = tmp_path / "products.jsonl"
+    shutil.copyfile("data/products.jsonl", jsonl_file)
+    (tmp_path / "products.pkl").write_bytes(b"cremoved_module\nProduct\n.")
+    indexer = Indexer(str(jsonl_file))
+    indexer.load_products()
+    cached_indexer = Indexer(str(jsonl_file))
+    cached_indexer.load_products()
+
+    assert len(indexer.products_list) == 156
+    assert cached_indexer.products_list == indexer.products_list
@@ -0,0 +1,259 @@
+"""Tests for the SearchEngine class and its methods."""
+
+import os
+import shutil
+import orjson
+import pytest
+from search_engine.search_engine import SearchEngine
+
+
+@pytest.fixture(name="search_engine")
+def fixture_search_engine(tmp_path, monkeypatch):
+    """
+    Builds a search engine on a copy of the data directory, so that the caches
+    written next to the data do not touch the project's data.
+    """
+    data_path = tmp_path / "TP3"
+    shutil.copytree(SearchEngine.DATA_PATH, data_path)
+    monkeypatch.setattr(SearchEngine, "DATA_PATH", str(data_path))
+    monkeypatch.chdir(tmp_path)
+
+    engine = SearchEngine()
+    engine.load_indexes()
+    yield engine
+    engine.close()
+
+
+@pytest.mark.parametrize(
+    "query, nb_filtered_docs, top_url, top_scores",
+    [
+        (
+            "chocolate box",
+            21,
+            "https://web-scraping.dev/product/1",
+            [13.662980794983234, 13.252653019033982, 12.98154694456634],
+        ),
+        (
+            "energy drink",
+            39,
+            "https://web-scraping.dev/product/17",
+            [9.619913835260654, 9.308369853285434, 9.248597444299008],
+        ),
+        ("swiss", 8, None, [5.323974651283486, 5.323974651283486, 5.31332549474436]),
+    ],
+)
+def test_search(search_engine, query, nb_filtered_docs, top_url, top_scores):
+    """
+    Tests the top results of a few fixed queries.
+
+    Asserts:
+        - The number of documents after filtering is the expected one.
+        - The best product is the expected one, when it is not tied.
+        - The scores of the best products are the expected ones.
+    """
+    results = search_engine.search(query, limit=3)
+    products = results["Products"]
+
+    assert results["Total number of documents"] == 156
+    assert results["Number of documents after filtering"] == nb_filtered_docs
+    if top_url is not None:
+        assert products[0]["url"] == top_url
+    assert [product["score"] for product in products] == pytest.approx(top_scores)
+
+
+def test_rank_docs_with_limit(search_engine):
+    """
+    Tests that ranking with a limit keeps the same best scores as ranking all the
+    matching documents.
+
+    Asserts:
+        - The scores kept with a limit are the best scores of the full ranking.
+    """
+    for query in ["chocolate box", "energy drink", "usa", "italy south africa"]:
+        matching_docs = search_engine.get_matching_docs(query)
+        all_scores = search_engine.rank_docs(query, matching_docs)
+        top_scores = search_engine.rank_docs(query, matching_docs, limit=5)
+
+        assert sorted(top_scores.values()) == sorted(all_scores.values())[-5:]
+
+
+def test_get_token_synonyms(search_engine):
+    """
+    Tests retrieving the synonyms of an origin key, of one of its synonyms, and of
+    a token without synonyms.
+
+    Asserts:
+        - A key returns itself followed by its synonyms.
+        - A synonym returns itself, the other synonyms, and its key.
+        - A token without synonyms returns itself only.
+    """
+    assert search_engine.get_token_synonyms("USA") == [
+        "usa",
+        "united states",
+        "united states of america",
+        "america",
+    ]
+    assert search_engine.get_token_synonyms("america") == [
+        "america",
+        "united states",
+        "united states of america",
+        "usa",
+    ]
+    assert search_engine.get_token_synonyms("swiss") == ["swiss", "switzerland"]
+    assert search_engine.get_token_synonyms("chocolate") == ["chocolate"]
+
+
+def test_get_query_tokens_with_synonyms(search_engine):
+    """
+    Tests that the query tokens are expanded with synonyms, without stopwords,
+    and that repeated tokens are kept once, in order.
+
+    Asserts:
+        - The stopwords are removed.
+        - Each token appears once, in the order of its first occurrence.
+    """
+    tokens = search_engine.get_query_tokens_with_synonyms(
+        "the usa and america chocolate chocolate"
+    )
+
+    assert tokens == [
+        "usa",
+        "united states",
+        "united states of america",
+        "america",
+        "chocolate",
+    ]
+
+
+def test_query_results_cache(search_engine, monkeypatch):
+    """
+    Tests that queries with the same tokens reuse the cached ranking, that the
+    cached results cannot be modified by a caller, and that reloading modified
+    indexes invalidates the cache.
+
+    Asserts:
+        - A query with the same tokens as a previous one is not ranked again.
+        - Modifying the returned results does not modify the cache.
+        - A query is ranked again once a modified index has been reloaded.
+    """
+    rank_docs = search_engine.rank_docs
+    ranked_queries = []
+
+    def counting_rank_docs(query, matching_docs, limit=None):
+        ranked_queries.append(query)
+        return rank_docs(query, matching_docs, limit)
+
+    monkeypatch.setattr(search_engine, "rank_docs", counting_rank_docs)
+
+    results = search_engine.search("chocolate box")
+    results["Products"].clear()
+    same_results = search_engine.search("The chocolate, box!")
+
+    assert ranked_queries == ["chocolate box"]
+    assert len(same_results["Products"]) == 5
+
+    brand_index_file = f"{SearchEngine.DATA_PATH}/brand_index.json"
+    mtime = os.path.getmtime(brand_index_file)
+    os.utime(brand_index_file, (mtime + 10, mtime + 10))
+    search_engine.load_indexes()
+    search_engine.search("chocolate box")
+
+    assert ranked_queries == ["chocolate box", "chocolate box"]
+
+
+def test_indexes_cache(search_engine):
+    """
+    Tests that the indexes cache is reused while the index files are unchanged,
+    and invalidated once one of them is modified.
+
+    Asserts:
+        - A new search engine loads the same structures from the cache.
+        - The cache is stale once an index file has been modified.
+        - Reloading the indexes refreshes the cache.
+    """
+    cached_engine = SearchEngine()
+
+    assert cached_engine.load_indexes_cache(cached_engine.get_index_mtimes())
+    for attribute in SearchEngine.CACHED_ATTRIBUTES:
+        assert getattr(cached_engine, attribute) == getattr(search_engine, attribute)
+
+    title_index_file = f"{SearchEngine.DATA_PATH}/title_index.json"
+    mtime = os.path.getmtime(title_index_file)
+    os.utime(title_index_file, (mtime + 10, mtime + 10))
+
+    assert not cached_engine.load_indexes_cache(cached_engine.get_index_mtimes())
+    cached_engine.load_indexes()
+    assert cached_engine.load_indexes_cache(cached_engine.get_index_mtimes())
+
+
+def test_indexes_cache_fingerprint(search_engine, monkeypatch):
+    """
+    Tests that the indexes cache is invalidated when the BM25 coefficients change,
+    even though the index files are unchanged.
+
+    Asserts:
+        - The cache is stale once K1 has been modified.
+        - The BM25 scores are computed again with the new coefficient.
+    """
+    results = search_engine.search("chocolate box")
+    monkeypatch.setattr(SearchEngine, "K1", 0.5)
+    engine = SearchEngine()
+
+    assert not engine.load_indexes_cache(engine.get_index_mtimes())
+    engine.load_indexes()
+    new_results = engine.search("chocolate box")
+
+    assert new_results["Products"][0]["score"] != results["Products"][0]["score"]
+
+
+def test_load_indexes_clears_query_tokens(search_engine):
+    """
+    Tests that reloading the indexes drops the query tokens expanded with the
+    previous synonyms.
+
+    Asserts:
+        - A synonym removed from the synonyms file is no longer expanded.
+    """
+    assert search_engine.get_query_tokens_with_synonyms("swiss") == [
+        "swiss",
+        "switzerland",
+    ]
+
+    synonyms_file = f"{SearchEngine.DATA_PATH}/origin_synonyms.json"
+    with open(synonyms_file, "rb") as file:
+        synonyms = orjson.loads(file.read())
+    del synonyms["switzerland"]
+    with open(synonyms_file, "wb") as file:
+        file.write(orjson.dumps(synonyms))
+    mtime = os.path.getmtime(synonyms_file)
+    os.utime(synonyms_file, (mtime + 10, mtime + 10))
+    search_engine.load_indexes()
+
+    assert search_engine.get_query_tokens_with_synonyms("swiss") == ["swiss"]
+
+
+def test_search_batch(search_engine, monkeypatch):
+    """
+    Tests that a batch of queries ranks the queries expanding to the same tokens
+    only once, and returns the results of every query.
+
+    Asserts:
+        - Each distinct set of query tokens is ranked once.
+        - Every query of the batch has its results, equal to those of `search`.
+    """
+    rank_docs = search_engine.rank_docs
+    ranked_queries = []
+
+    def counting_rank_docs(query, matching_docs, limit=None):
+        ranked_queries.append(query)
+        return rank_docs(query, matching_docs, limit)
+
+    monkeypatch.setattr(search_engine, "rank_docs", counting_rank_docs)
+
+    queries = ["chocolate box", "swiss", "The chocolate, box!", "swiss"]
+    batch_results = search_engine.search_batch(queries, limit=3)
+
+    assert ranked_queries == ["chocolate box", "swiss"]
+    assert set(batch_results) == set(queries)
+    assert batch_results["The chocolate, box!"] == batch_results["chocolate box"]
+    assert batch_results["swiss"] == search_engine.search("swiss", limit=3)